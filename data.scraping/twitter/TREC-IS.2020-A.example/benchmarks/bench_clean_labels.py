@@ -0,0 +1,125 @@
+"""Compare the label cleaning stages of clean_labels.py against their
+previous row-wise implementations on a synthetic label set, checking
+that both give identical output.
+
+    python benchmarks/bench_clean_labels.py --n-rows 5000000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'preparation'))
+
+from clean_labels import (encode_post_categories, encode_post_priority,  # noqa: E402
+                          simplify_event_ids)
+
+EVENTS = ['fireColorado2012', 'costaRicaEarthquake2012', 'floodColorado2013',
+          'typhoonPablo2012', 'earthquakeNepal2015', 'hurricaneFlorence2018']
+PRIORITIES = ['Critical', 'High', 'Medium', 'Low', 'Unknown']
+CATEGORIES = ['Advice', 'CleanUp', 'ContextualInformation', 'Discussion',
+              'Donations', 'EmergingThreats', 'Factoid', 'FirstPartyObservation',
+              'GoodsServices', 'Hashtags', 'InformationWanted', 'Irrelevant',
+              'Location', 'MovePeople', 'MultimediaShare', 'NewSubEvent',
+              'News', 'Official', 'OriginalEvent', 'SearchAndRescue',
+              'Sentiment', 'ServiceAvailable', 'ThirdPartyObservation',
+              'Volunteer', 'Weather']
+
+
+def legacy_simplify_event_ids(labels, pattern=r'\w+\d{4}'):
+    labels = labels.copy()
+    labels['datasetID'] = labels.eventID
+    labels.eventID = labels.eventID.apply(lambda x: re.match(pattern, x).group())
+    return labels
+
+
+def legacy_encode_post_priority(labels, mapping):
+    labels = labels.copy()
+    not_in_mapping = labels.postPriority.apply(lambda x: x not in mapping.keys())
+    labels = labels.drop(labels.index[not_in_mapping], axis='index')
+    labels['Priority'] = labels.postPriority.map(mapping)
+    return labels.drop(columns=['postPriority'])
+
+
+def legacy_encode_post_categories(labels):
+    labels = labels[labels.postCategories.apply(len) > 0]
+    _ = labels.postCategories.apply(pd.Series).stack()
+    # ``sum(level=0)`` was removed from pandas, this is its replacement
+    one_hot_categories = pd.get_dummies(_).groupby(level=0).sum().astype(np.int8)
+    labels = labels.join(one_hot_categories)
+    return labels.drop(columns=['postCategories']), one_hot_categories
+
+
+def make_labels(n_rows, seed=42):
+    rgen = np.random.RandomState(seed)
+    segments = rgen.randint(1, 4, size=n_rows)
+    events = np.array(EVENTS, dtype=object)[rgen.randint(len(EVENTS), size=n_rows)]
+    n_categories = rgen.randint(0, 4, size=n_rows)
+    categories = np.array(CATEGORIES, dtype=object)
+    return pd.DataFrame({
+        'eventID': [f'{e}S{s}' for e, s in zip(events, segments)],
+        'postID': np.arange(n_rows).astype(str),
+        'postPriority': np.array(PRIORITIES, dtype=object)[
+            rgen.randint(len(PRIORITIES), size=n_rows)],
+        'postCategories': [list(categories[rgen.randint(len(categories), size=n)])
+                           for n in n_categories],
+    })
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    labels = make_labels(args.n_rows)
+    mapping = {'Critical': 1.0, 'High': 0.75, 'Medium': 0.5, 'Low': 0.25}
+    print(f'{len(labels)} synthetic annotations')
+
+    stages = [
+        ('simplify_event_ids', legacy_simplify_event_ids, simplify_event_ids,
+         (labels,)),
+        ('encode_post_priority', legacy_encode_post_priority,
+         encode_post_priority, (labels, mapping)),
+        ('encode_post_categories', legacy_encode_post_categories,
+         encode_post_categories, (labels,)),
+    ]
+    for name, legacy, vectorized, stage_args in stages:
+        expected, legacy_time = timed(legacy, *stage_args)
+        result, vectorized_time = timed(vectorized, *stage_args)
+
+        if isinstance(expected, tuple):
+            for e, r in zip(expected, result):
+                pd.testing.assert_frame_equal(e, r)
+        else:
+            pd.testing.assert_frame_equal(expected, result)
+
+        print(f'{name:>24}: {legacy_time:8.2f}s -> {vectorized_time:6.2f}s '
+              f'({legacy_time / vectorized_time:.0f}x)')
+
+    # The sparse one-hot columns must stay int8, and hold the same counts,
+    # also for labels out of index order as after deduplication
+    shuffled = labels.sample(frac=1, random_state=0)
+    (_, expected_categories), _ = timed(encode_post_categories, shuffled)
+    (_, categories), sparse_time = timed(encode_post_categories, shuffled,
+                                         True)
+    assert (categories.dtypes == pd.SparseDtype(np.int8, 0)).all(), \
+        categories.dtypes.unique()
+    pd.testing.assert_frame_equal(categories.sparse.to_dense(),
+                                  expected_categories)
+    print(f'{"encode_post_categories":>24}: sparse {sparse_time:6.2f}s, '
+          f'{categories.memory_usage().sum() / 2 ** 20:.1f} MiB vs '
+          f'{expected_categories.memory_usage().sum() / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
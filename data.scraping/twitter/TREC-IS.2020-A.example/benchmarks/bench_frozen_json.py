@@ -0,0 +1,75 @@
+"""Compare navigating Tweets with FrozenJSON, CompactFrozenJSON and the
+extract() path API.
+
+    python benchmarks/bench_frozen_json.py --n-tweets 200000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utilities.dict import CompactFrozenJSON, FrozenJSON, extract  # noqa: E402
+
+
+def make_tweet(i):
+    return {
+        'id_str': str(i),
+        'full_text': f'Tweet number {i} #flood',
+        'user': {'id_str': str(i % 1000), 'screen_name': f'user{i % 1000}',
+                 'followers_count': i % 5000, 'description': 'lorem ipsum'},
+        'entities': {'hashtags': [{'text': 'flood', 'indices': [15, 21]}],
+                     'urls': [], 'user_mentions': []},
+    }
+
+
+def navigate(tweets, passes):
+    columns = ([], [])
+    for _ in range(passes):
+        for tweet in tweets:
+            columns[0].append(tweet.user.screen_name)
+            columns[1].append(tweet.entities.hashtags)
+    return columns
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    # Memory is traced in a separate run, since tracing slows it down
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-tweets', type=int, default=200000)
+    parser.add_argument('--passes', type=int, default=3)
+    args = parser.parse_args()
+
+    tweets = [make_tweet(i) for i in range(args.n_tweets)]
+    paths = ['user.screen_name', 'entities.hashtags']
+    print(f'{args.n_tweets} tweets, {args.passes} passes over '
+          f'{", ".join(paths)}')
+
+    cases = [
+        ('FrozenJSON', lambda: navigate(
+            [FrozenJSON(t) for t in tweets], args.passes)),
+        ('CompactFrozenJSON', lambda: navigate(
+            [CompactFrozenJSON(t) for t in tweets], args.passes)),
+        ('extract', lambda: [extract(tweets, paths)
+                             for _ in range(args.passes)]),
+    ]
+    for name, func in cases:
+        elapsed, peak = timed(func)
+        print(f'{name:>18}: {elapsed:6.2f}s, peak {peak / 2 ** 20:7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
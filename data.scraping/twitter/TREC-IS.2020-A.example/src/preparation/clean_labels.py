@@ -1,11 +1,33 @@
+import argparse
+import json
 import numpy as np
 import pandas as pd
+import scipy.sparse
 import re
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from xml_parsing import XMLTopicsParser
-from get_tweets import TweetViewer, yeld_chunks
-from get_tweets import make_chunks
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utilities.xml import TopicRegistry
+from load_tweets import TweepyDownloader, yield_chunks, hydrate
+
+PRIORITY_MAPPING = {
+    'Critical': 1.0,
+    'High': 0.75,
+    'Medium': 0.5,
+    'Low': 0.25
+}
+
+# Partitions of the exported labels and tweets, as <eventType>/<eventID>/
+# directories under separate labels/ and tweets/ roots, so that a
+# categorized corpus reader of either root sees event types as categories
+# and only documents of one kind
+PARTITION_KEYS = ['eventType', 'eventID']
+
+# Parsed topic files, cached across runs
+TOPICS_CACHE_DIR = 'data/interim/topics'
 
 
 def simplify_event_ids(labels: pd.DataFrame, pattern=r'\w+\d{4}') -> pd.DataFrame:
@@ -15,17 +37,31 @@ def simplify_event_ids(labels: pd.DataFrame, pattern=r'\w+\d{4}') -> pd.DataFram
     labels = labels.copy()
     labels['datasetID'] = labels.eventID 
 
-    event_ids = labels.eventID.apply(lambda x: re.match(pattern, x).group())
-    labels.eventID = event_ids
+    # Match only the few unique event ids rather than every annotation
+    codes, uniques = pd.factorize(labels.eventID)
+    simplified = np.array([re.match(pattern, x).group() for x in uniques],
+                          dtype=object)
+    # factorize codes missing event ids as -1, which would otherwise pick
+    # the last unique id
+    simplified = np.append(simplified, np.nan)
+    labels.eventID = simplified[np.where(codes == -1, len(uniques), codes)]
 
     return labels
 
 
-def join_with_event_types(labels: pd.DataFrame, topics_path: str) -> pd.DataFrame:
-    """Merge labels with event types from the proper topics XML file
+def parse_event_types(topics_path: str,
+                      cache_dir=TOPICS_CACHE_DIR) -> pd.DataFrame:
+    return TopicRegistry(topics_path, cache_dir=cache_dir).attribs(
+        ['dataset', 'type'])
+
+
+def join_with_event_types(labels: pd.DataFrame, topics_path: str,
+                          event_types=None) -> pd.DataFrame:
+    """Merge labels with event types from the proper topics XML file, 
+    or from already parsed ``event_types``
     """
-    xml_parser = XMLTopicsParser(topics_path)
-    event_types = xml_parser.parse_attribs(['dataset', 'type'])
+    if event_types is None:
+        event_types = parse_event_types(topics_path)
 
     labels = labels.copy()
     labels = pd.merge(labels, event_types, left_on='eventID', 
@@ -39,20 +75,14 @@ def join_with_event_types(labels: pd.DataFrame, topics_path: str) -> pd.DataFram
 
 
 def encode_post_priority(labels: pd.DataFrame, mapping='default') -> pd.DataFrame:
-    if mapping is 'default':
-        mapping = {
-            'Critical': 1.0,
-            'High': 0.75,
-            'Medium': 0.5,
-            'Low': 0.25
-        }
+    if mapping == 'default':
+        mapping = PRIORITY_MAPPING
     
     labels = labels.copy()
 
     # Dropping postPriority values that are not in mapping keys
-    priority_cat = labels.postPriority
-    not_in_mapping = priority_cat.apply(lambda x: x not in mapping.keys())
-    labels = labels.drop(labels.index[not_in_mapping], axis='index')
+    in_mapping = labels.postPriority.isin(list(mapping.keys()))
+    labels = labels[in_mapping]
 
     numerical_priority = labels.postPriority.map(mapping)
     labels['Priority'] = numerical_priority
@@ -61,12 +91,36 @@ def encode_post_priority(labels: pd.DataFrame, mapping='default') -> pd.DataFram
     return labels
 
 
-def encode_post_categories(labels: pd.DataFrame) -> (pd.DataFrame, pd.DataFrame):
+def encode_post_categories(labels: pd.DataFrame, 
+                           sparse=False) -> (pd.DataFrame, pd.DataFrame):
+    """One-hot encode the lists of post categories, counting repeated ones.
+    Categories are columns in sorted order, as ``pd.get_dummies`` does. 
+    With ``sparse`` the columns are stored as sparse int8 arrays.
+    """
     # Get rid of annotations without assigned categories
-    labels = labels[labels.postCategories.apply(len) > 0] 
-
-    _ = labels.postCategories.apply(pd.Series).stack()
-    one_hot_categories = pd.get_dummies(_).sum(level=0).astype(np.int8)
+    n_categories = labels.postCategories.str.len()
+    labels = labels[n_categories > 0]
+    n_categories = n_categories[n_categories > 0].to_numpy()
+
+    # Build the (annotations, categories) count matrix from the flattened 
+    # lists, summing repeated (row, column) entries
+    codes, columns = pd.factorize(labels.postCategories.explode(), sort=True)
+    rows = np.repeat(np.arange(len(labels)), n_categories)
+    counts = scipy.sparse.csr_matrix(
+        (np.ones(len(codes), dtype=np.int8), (rows, codes)),
+        shape=(len(labels), len(columns)))
+
+    # Sort the rows by index before building the frame, since sorting a
+    # sparse frame upcasts its columns to int64
+    order = np.argsort(labels.index.to_numpy(), kind='stable')
+    counts, index = counts[order], labels.index[order]
+
+    if sparse:
+        one_hot_categories = pd.DataFrame.sparse.from_spmatrix(
+            counts, index=index, columns=columns)
+    else:
+        one_hot_categories = pd.DataFrame(counts.toarray(), 
+                                          index=index, columns=columns)
 
     labels = labels.join(one_hot_categories)    
     labels = labels.drop(columns=['postCategories']) # Clean-up
@@ -75,11 +129,11 @@ def encode_post_categories(labels: pd.DataFrame) -> (pd.DataFrame, pd.DataFrame)
 
 
 def download_tweets(labels, api_keys_path):
-    tweet_viewer = TweetViewer(api_keys_path=api_keys_path)
+    tweet_viewer = TweepyDownloader(api_keys_path=api_keys_path)
     tweets = []
-    for labels_chunk in make_chunks(labels):
+    for id_chunk in yield_chunks(labels):
         status_objs = tweet_viewer.pull_tweets(
-            tweet_ids=list(labels_chunk.postID.astype(str)),
+            tweet_ids=[str(id_) for id_ in id_chunk],
             tweet_mode='extended', map_=True)
         tweets += [s._json for s in status_objs]
         print(f'Got {len(tweets)} tweets...')
@@ -88,7 +142,291 @@ def download_tweets(labels, api_keys_path):
     return tweets
 
 
-if __name__  == '__main__':
+def iter_json_array(path, chunk_size=100000, buffer_size=1 << 20):
+    """Stream the records of a file holding a single JSON array, such as
+    the TREC-IS labels, as lists of at most ``chunk_size`` records, while
+    reading only ``buffer_size`` characters of the file at a time.
+    """
+    decoder = json.JSONDecoder()
+    records = []
+
+    with open(path, 'r', encoding='utf8') as fp:
+        buffer = fp.read(buffer_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f'{path} does not hold a JSON array')
+        pos = 1
+
+        while True:
+            # Skip whitespace and separators between records
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                break
+
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The next record continues past the end of the buffer
+                more = fp.read(buffer_size)
+                if not more:
+                    raise
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+
+            records.append(record)
+            if len(records) == chunk_size:
+                yield records
+                records = []
+
+    if records:
+        yield records
+
+
+def iter_label_chunks(path, chunk_size=100000):
+    """Stream raw labels as DataFrames of at most ``chunk_size`` rows"""
+    for records in iter_json_array(path, chunk_size):
+        chunk = pd.DataFrame.from_records(records)
+        chunk['postID'] = chunk.postID.astype(np.str_)
+        yield chunk
+
+
+def scan_labels(path, event_types, mapping='default', chunk_size=100000):
+    """First pass of the streaming pipeline over the raw labels. Returns a
+    mask of the annotations kept by ``drop_duplicates('postID', keep='last')``
+    over the whole file, and the sorted post categories of annotations that
+    pass the row-wise filters of the pipeline.
+
+    Only post ids are held in memory, so category columns of the streaming
+    output may include categories that only appear in superseded duplicate
+    annotations, filled with zeros.
+    """
+    if mapping == 'default':
+        mapping = PRIORITY_MAPPING
+
+    last_position = {}  # postID -> position of its last annotation
+    categories = set()
+    n_rows = 0
+
+    for chunk in iter_label_chunks(path, chunk_size):
+        positions = range(n_rows, n_rows + len(chunk))
+        last_position.update(zip(chunk.postID, positions))
+        n_rows += len(chunk)
+
+        chunk = simplify_event_ids(chunk)
+        valid = (chunk.eventID.isin(event_types.dataset)
+                 & chunk.postPriority.isin(list(mapping.keys())))
+        categories.update(chunk.postCategories[valid].explode().dropna())
+
+    keep = np.zeros(n_rows, dtype=bool)
+    keep[np.fromiter(last_position.values(), dtype=np.int64)] = True
+
+    return keep, sorted(categories)
+
+
+def stream_labels(raw_labels_path, topics_path, labels_path, categories_path,
+                  chunk_size=100000):
+    """Clean and encode the raw labels in chunks of ``chunk_size`` rows,
+    appending them to the processed labels and un-processed categories
+    files, so that peak memory depends on the chunk size rather than on
+    the size of the raw labels.
+    """
+    event_types = parse_event_types(topics_path)
+    keep, categories = scan_labels(raw_labels_path, event_types,
+                                   chunk_size=chunk_size)
+    print('Annotations before dropping duplicates...', len(keep))
+    print('Annotations after dropping duplicates...', keep.sum())
+
+    cols = ['eventType', 'eventID', 'postID'] + categories + ['Priority']
+    _cols = ['eventType', 'eventID',  'postID', 'postCategories']
+    n_rows, n_labels = 0, 0
+
+    with open(labels_path, 'w') as labels_fp, \
+            open(categories_path, 'w') as categories_fp:
+        for raw_labels in iter_label_chunks(raw_labels_path, chunk_size):
+            chunk_keep = keep[n_rows:n_rows + len(raw_labels)]
+            n_rows += len(raw_labels)
+
+            raw_labels = simplify_event_ids(raw_labels[chunk_keep])
+            _write_lines(raw_labels[_cols], categories_fp)
+
+            labels = join_with_event_types(raw_labels, topics_path,
+                                           event_types)
+            labels = encode_post_priority(labels)
+            labels, _ = encode_post_categories(labels)
+
+            # A chunk may lack some of the categories of the whole file
+            labels = labels.reindex(columns=cols)
+            labels[categories] = labels[categories].fillna(0).astype(np.int8)
+            _write_lines(labels, labels_fp)
+
+            n_labels += len(labels)
+            print(f'Processed {n_rows} annotations...')
+
+    return n_labels
+
+
+def _write_lines(df, fp):
+    if len(df):
+        # Older pandas versions don't end the last line with a newline
+        lines = df.to_json(orient='records', lines=True)
+        fp.write(lines if lines.endswith('\n') else lines + '\n')
+
+
+def iter_id_chunks(labels_path, chunk_size=100):
+    """Stream the post ids of processed labels in chunks of ``chunk_size``"""
+    chunk = []
+    with open(labels_path, 'r') as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+            chunk.append(str(json.loads(line)['postID']))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def filter_lines(path, keep_record):
+    """Rewrite a line-delimited JSON file one line at a time, keeping only
+    the records for which ``keep_record`` is true
+    """
+    tmp_path = path + '.tmp'
+    n_kept = 0
+    with open(path, 'r') as in_fp, open(tmp_path, 'w') as out_fp:
+        for line in in_fp:
+            if line.strip() and keep_record(json.loads(line)):
+                out_fp.write(line)
+                n_kept += 1
+    os.replace(tmp_path, path)
+    return n_kept
+
+
+def partition_path(output_dir, kind, event, prefix):
+    """Return the path of the ``kind`` ('labels' or 'tweets') file of the
+    partition of an (eventType, eventID) ``event``"""
+    return os.path.join(output_dir, kind, *event, f'{prefix}.jsonl')
+
+
+def _write_partition(df, path):
+    """Write one partition as line-delimited JSON, returning its number of
+    rows and bytes"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_json(path, orient='records', lines=True)
+    return len(df), os.path.getsize(path)
+
+
+def _partition_lines(path, events, key, output_dir, kind, prefix):
+    """Split a line-delimited JSON file into partitions in a single pass,
+    by the (eventType, eventID) of the ``key`` of each record in
+    ``events``. Returns the number of rows and bytes of every partition.
+    """
+    files, stats = {}, {}
+    try:
+        with open(path, 'r') as in_fp:
+            for line in in_fp:
+                if not line.strip():
+                    continue
+                event = events.get(str(json.loads(line)[key]))
+                if event is None:
+                    continue
+                if event not in files:
+                    out_path = partition_path(output_dir, kind, event, prefix)
+                    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                    files[event] = open(out_path, 'w')
+                    stats[event] = [0, out_path]
+                files[event].write(line.rstrip('\n') + '\n')
+                stats[event][0] += 1
+    finally:
+        for fp in files.values():
+            fp.close()
+
+    return {event: (n_rows, os.path.getsize(out_path))
+            for event, (n_rows, out_path) in stats.items()}
+
+
+def write_manifest(output_dir, stats):
+    """Write ``manifest.json`` listing the rows and bytes of the labels and
+    tweets of every partition, with paths relative to ``output_dir``
+    """
+    partitions = []
+    for event in sorted(stats):
+        partition = dict(zip(PARTITION_KEYS, event))
+        for kind, (path, n_rows, n_bytes) in sorted(stats[event].items()):
+            partition[kind] = {'path': os.path.relpath(path, output_dir),
+                               'rows': n_rows, 'bytes': n_bytes}
+        partitions.append(partition)
+
+    manifest = {'partition_keys': PARTITION_KEYS, 'partitions': partitions}
+    for kind in ('labels', 'tweets'):
+        manifest[kind] = {
+            total: sum(p[kind][total] for p in partitions if kind in p)
+            for total in ('rows', 'bytes')}
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as fp:
+        json.dump(manifest, fp, indent=2)
+    return manifest
+
+
+def export_partitions(labels, tweets, output_dir, prefix, max_workers=None):
+    """Split processed labels and their tweets into one labels and one
+    tweets file per event, ``labels/<eventType>/<eventID>/<prefix>.jsonl``
+    and ``tweets/<eventType>/<eventID>/<prefix>.jsonl`` under
+    ``output_dir``, written in parallel, and write their manifest. A
+    ``TweepyRawCorpusReader`` of ``<output_dir>/tweets`` reads the tweets
+    with event types as categories.
+    """
+    events = labels.drop_duplicates('postID', keep='last').set_index('postID')
+    tweet_events = events[PARTITION_KEYS].reindex(tweets.id_str.astype(np.str_))
+    tweet_groups = tweets.groupby([tweet_events.eventType.values,
+                                   tweet_events.eventID.values])
+
+    futures = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for kind, groups in (('labels', labels.groupby(PARTITION_KEYS)),
+                             ('tweets', tweet_groups)):
+            for event, group in groups:
+                path = partition_path(output_dir, kind, event, prefix)
+                futures[event, kind, path] = executor.submit(
+                    _write_partition, group, path)
+
+    stats = {}
+    for (event, kind, path), future in futures.items():
+        stats.setdefault(event, {})[kind] = (path,) + future.result()
+    return write_manifest(output_dir, stats)
+
+
+def partition_files(labels_path, tweets_path, output_dir, prefix,
+                    max_workers=None):
+    """Streaming version of ``export_partitions`` over the processed labels
+    and raw tweets files, holding only the event of every post id in
+    memory. Labels and tweets are split in parallel.
+    """
+    events = {}
+    with open(labels_path, 'r') as fp:
+        for line in fp:
+            if line.strip():
+                label = json.loads(line)
+                events[str(label['postID'])] = tuple(
+                    label[key] for key in PARTITION_KEYS)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            kind: executor.submit(_partition_lines, path, events, key,
+                                  output_dir, kind, prefix)
+            for kind, path, key in (('labels', labels_path, 'postID'),
+                                    ('tweets', tweets_path, 'id_str'))}
+
+    stats = {}
+    for kind, future in futures.items():
+        for event, (n_rows, n_bytes) in future.result().items():
+            path = partition_path(output_dir, kind, event, prefix)
+            stats.setdefault(event, {})[kind] = (path, n_rows, n_bytes)
+    return write_manifest(output_dir, stats)
+
+
+def main(max_workers=None):
     print('Importing and cleaning raw labels...')
     raw_labels_path = 'data/raw/train/labels/TRECIS_2018_2019-labels.json'
     raw_labels = pd.read_json(raw_labels_path, orient='records',
@@ -165,14 +503,70 @@ if __name__  == '__main__':
     raw_tweets_path = os.path.join(raw_tweets_dir, 
                                    'TRECIS_2018_2019-tweets.jsonl')
     raw_tweets.to_json(raw_tweets_path, orient='records', lines=True)
-        
-    
-    # Exporting to separate datasets and folders
-    # datasets = labels.groupby(['eventType', 'eventID'])
-
-    # for (event_type, event_id), indices in datasets.items()
-    #     path = os.path.join(path, event_type)
-    #     os.makedirs(path, exist_ok=True)
-        
-    #     data = datasets.get_group((event_type, event_id)).copy()
-    #     pd.to_json(os.path.join(path, f'{tweet_id}.jsonl'))
\ No newline at end of file
+
+    # Export to separate datasets and folders per event
+    print('Exporting partitions per event...')
+    manifest = export_partitions(processed_labels, raw_tweets,
+                                 'data/processed/train/events',
+                                 'TRECIS_2018_2019', max_workers)
+    print(f'{len(manifest["partitions"])} partitions exported')
+
+
+def stream_main(chunk_size, max_workers=None):
+    print('Streaming, cleaning and saving raw labels...')
+    raw_labels_path = 'data/raw/train/labels/TRECIS_2018_2019-labels.json'
+    topics_path = 'data/raw/TRECIS-2018-2019.topics.xml'
+    processed_labels_dir = 'data/processed/train/labels'
+    os.makedirs(processed_labels_dir, exist_ok=True)
+    processed_labels_path = os.path.join(processed_labels_dir, 
+                                         'TRECIS_2018_2019-labels.jsonl')
+    post_categories_path = os.path.join(processed_labels_dir, 
+                                        'TRECIS_2018_2019-categories.jsonl')
+    stream_labels(raw_labels_path, topics_path, processed_labels_path,
+                  post_categories_path, chunk_size)
+
+    # Download tweets, appending them to the raw tweets file as they come
+    print('Downloading tweets...')
+    api_keys_path = 'api_keys.yml'
+    raw_tweets_dir = 'data/raw/train/tweets'
+    os.makedirs(raw_tweets_dir, exist_ok=True)
+    raw_tweets_path = os.path.join(raw_tweets_dir, 
+                                   'TRECIS_2018_2019-tweets.jsonl')
+    checkpoint_path = os.path.join(raw_tweets_dir,
+                                   'TRECIS_2018_2019-tweets.checkpoint')
+    hydrate(iter_id_chunks(processed_labels_path),
+            TweepyDownloader(api_keys_path), raw_tweets_path,
+            checkpoint_path, tweet_mode='extended', map_=True)
+
+    # Drop annotations of no-longer-available tweets
+    print('Dropping no longer available tweets...')
+    available = set()
+    with open(raw_tweets_path, 'r') as fp:
+        for line in fp:
+            if line.strip():
+                available.add(json.loads(line)['id_str'])
+    n_labels = filter_lines(processed_labels_path,
+                            lambda label: str(label['postID']) in available)
+    print(f'{len(available)} tweets available')
+    print(f'{n_labels} annotations available')
+
+    print('Exporting partitions per event...')
+    manifest = partition_files(processed_labels_path, raw_tweets_path,
+                               'data/processed/train/events',
+                               'TRECIS_2018_2019', max_workers)
+    print(f'{len(manifest["partitions"])} partitions exported')
+
+
+if __name__  == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stream', action='store_true',
+                        help='process labels in chunks of bounded memory')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='processes writing the per-event partitions')
+    args = parser.parse_args()
+
+    if args.stream:
+        stream_main(args.chunk_size, args.max_workers)
+    else:
+        main(args.max_workers)
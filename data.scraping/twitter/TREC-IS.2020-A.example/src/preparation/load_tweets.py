@@ -1,51 +1,138 @@
+import json
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import numpy as np
 import pandas as pd
 import yaml
 import tweepy
 
+from rate_limits import RateLimitScheduler
+
 
 class TweepyDownloader():
-    """Dowloader of Tweets using Tweepy library API. Refreshes rate limit statuses
-    depending on the current rate limit status' reset time rather than default 
+    """Dowloader of Tweets using Tweepy library API. Schedules requests over
+    one or more sets of credentials with a ``RateLimitScheduler``, which keeps
+    track of the remaining quota of each rather than relying on default 
     hard-coded Tweepy behaviour (15 minutes after every excess of rate limit)
     """
 
-    def __init__(self, api_keys_path):
-        self.api = tweepy.API(self.make_auth_handler(api_keys_path))
+    LOOKUP = '/statuses/lookup'
 
-    def make_auth_handler(self, api_keys_path):
+    def __init__(self, api_keys_path):
+        self.apis = [tweepy.API(self.make_auth_handler(api_keys))
+                     for api_keys in self.load_api_keys(api_keys_path)]
+        self.api = self.apis[0]
+        self.scheduler = RateLimitScheduler(len(self.apis))
+
+    def load_api_keys(self, api_keys_path):
+        """Return a list of credential sets, either listed under the 
+        ``credentials`` key of the YAML file or a single one at its top level
+        """
         with open(api_keys_path, 'r') as fp:
             api_keys = yaml.safe_load(fp)
-            consumer_key = api_keys['consumer_key']
-            consumer_secret = api_keys['consumer_secret']
-            auth = tweepy.AppAuthHandler(consumer_key, consumer_secret)
+        return api_keys.get('credentials', [api_keys])
+
+    def make_auth_handler(self, api_keys):
+        consumer_key = api_keys['consumer_key']
+        consumer_secret = api_keys['consumer_secret']
+        auth = tweepy.AppAuthHandler(consumer_key, consumer_secret)
         return auth 
 
     def pull_tweets(self, tweet_ids, **lookup_kwargs):
         while True:
+            i = self.scheduler.acquire(self.LOOKUP)
+            api = self.apis[i]
             try:
-                statuses = self.api.statuses_lookup(tweet_ids, **lookup_kwargs)
+                statuses = api.statuses_lookup(tweet_ids, **lookup_kwargs)
             except tweepy.RateLimitError as err:
-                epsilon = 5  # seconds of additional time.sleep()
-                rls = self.api.rate_limit_status('statuses')
-                sleep_for = np.ceil(rls['resources']['statuses']
-                                       ['/statuses/lookup']['reset']
-                                    - time.time()) + epsilon
-                msg = 'Error {0}, sleeping for {1:.0f}s'
-                print(msg.format(err.reason, sleep_for))
-                time.sleep(sleep_for)
+                epsilon = 5  # seconds of additional waiting
+                rls = api.rate_limit_status('statuses')
+                reset = (rls['resources']['statuses'][self.LOOKUP]['reset'] 
+                         + epsilon)
+                msg = 'Error {0} for credentials {1}, exhausted for {2:.0f}s'
+                print(msg.format(err.reason, i, np.ceil(reset - time.time())))
+                self.scheduler.exhaust(i, self.LOOKUP, reset)
             else:
+                self.sync_quota(i, api)
                 return statuses
 
+    def sync_quota(self, i, api):
+        """Update the scheduler with the quota reported by the last response"""
+        response = getattr(api, 'last_response', None)
+        if response is None:
+            return
+        headers = response.headers
+        if 'x-rate-limit-remaining' in headers:
+            self.scheduler.update(i, self.LOOKUP, 
+                                  int(headers['x-rate-limit-remaining']),
+                                  int(headers['x-rate-limit-reset']))
+
 def yield_chunks(df, chunk_size=100):
     return (list(df.iloc[i:i+chunk_size, df.columns.get_loc('postID')]) 
             for i in range(0, len(df), chunk_size))
 
 
+def read_checkpoint(checkpoint_path):
+    """Return the set of chunk numbers already saved by previous runs"""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, 'r') as fp:
+        return {int(line) for line in fp if line.strip()}
+
+
+def hydrate(chunks, downloader, output_path, checkpoint_path, 
+            max_workers=4, **lookup_kwargs):
+    """Look up chunks of Tweet ids concurrently, appending the Tweets of 
+    every finished chunk to a line-delimited JSON file as soon as it is 
+    done. Numbers of saved chunks are appended to a checkpoint file, and 
+    chunks found there are skipped, so that an interrupted run can be 
+    resumed by calling ``hydrate`` again with the same chunks.
+
+    Rate limiting is left to ``downloader.pull_tweets``, whose scheduler
+    is shared by all workers.
+    """
+    done = read_checkpoint(checkpoint_path)
+    pending = ((i, chunk) for i, chunk in enumerate(chunks) if i not in done)
+    n_tweets = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            open(output_path, 'a') as out_fp, \
+            open(checkpoint_path, 'a') as checkpoint_fp:
+        in_flight = {}
+        while True:
+            # Keep at most ``max_workers`` lookups in flight, so that ids 
+            # are only read and results only held for running requests
+            for i, chunk in pending:
+                future = executor.submit(downloader.pull_tweets, chunk, 
+                                         **lookup_kwargs)
+                in_flight[future] = i
+                if len(in_flight) >= max_workers:
+                    break
+
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = in_flight.pop(future)
+                statuses = future.result()
+                for status in statuses:
+                    out_fp.write(json.dumps(status._json) + '\n')
+                out_fp.flush()
+
+                # Only checkpoint a chunk once its Tweets are on disk
+                checkpoint_fp.write(f'{i}\n')
+                checkpoint_fp.flush()
+
+                n_tweets += len(statuses)
+                print(f'Got {n_tweets} tweets...')
+
+    return n_tweets
+
+
 def main():
     tweet_labels_path = 'data/raw/labels/TRECIS_2018_2019-labels.json'
     api_keys_path = 'api_keys.yml'
@@ -54,24 +141,20 @@ def main():
                                 dtype=dict(postID=np.str_))
     loader = TweepyDownloader(api_keys_path)
 
-    tweet_json = []
-    kwargs = dict(tweet_mode='extended', map_=True)
-    for id_chunk in yield_chunks(tweet_labels):
-        tweet_json += [s._json for s in loader.pull_tweets(id_chunk, **kwargs)]
-        print(f'Got {len(tweet_json)} tweets...')
-
-    tweets = pd.DataFrame(tweet_json)
-
     target_path = 'data/raw/tweets'
     target_filename = 'TRECIS_2018_2019-tweets.jsonl'
+    checkpoint_filename = 'TRECIS_2018_2019-tweets.checkpoint'
 
     if not os.path.exists(target_path):
         os.makedirs(target_path)
-    
-    tweets.to_json(os.path.join(target_path, target_filename), 
-                                orient='records', lines=True)
+
+    kwargs = dict(tweet_mode='extended', map_=True)
+    hydrate(yield_chunks(tweet_labels), loader, 
+            os.path.join(target_path, target_filename),
+            os.path.join(target_path, checkpoint_filename), **kwargs)
     msg = 'Saved to... {0}'
     print(msg.format(os.path.join(os.path.join(target_path, target_filename))))
+    print('Rate limit metrics...', loader.scheduler.metrics())
 
 
 if __name__  == '__main__':
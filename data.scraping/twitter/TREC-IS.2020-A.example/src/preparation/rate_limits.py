@@ -0,0 +1,132 @@
+import threading
+import time
+
+# Requests allowed per window of seconds for app auth, by endpoint
+LIMITS = {
+    '/statuses/lookup': (300, 15 * 60),
+}
+
+
+class TokenBucket():
+    """Request quota of a single endpoint for a single set of credentials.
+    Tokens refill continuously at ``limit / window`` per second, unless
+    the API reported the quota as exhausted, in which case the bucket is
+    empty until the reported reset time and full right after it.
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self.updated = time.time()
+        self.blocked_until = 0.0
+
+    def refill(self, now):
+        if now < self.blocked_until:
+            return
+        if self.blocked_until:
+            self.tokens = float(self.limit)
+            self.blocked_until = 0.0
+        else:
+            elapsed = now - self.updated
+            self.tokens = min(self.limit, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RateLimitScheduler():
+    """Thread-safe scheduler of requests over several sets of credentials.
+    Tracks the remaining quota of every endpoint for every credential set
+    and hands out the credentials with the most headroom, sleeping only
+    when all of them are out of quota, rather than waiting for the API to
+    refuse a request.
+    """
+
+    def __init__(self, n_credentials, limits=LIMITS):
+        self.n_credentials = n_credentials
+        self.buckets = {
+            (i, endpoint): TokenBucket(limit, window)
+            for i in range(n_credentials)
+            for endpoint, (limit, window) in limits.items()
+        }
+
+        self.started = time.time()
+        self.requests = 0
+        self.rate_limited = 0
+        # Stalls, when all credentials are out of quota for an endpoint, are
+        # counted once and timed by the wall clock however many threads
+        # wait on them
+        self.sleeps = 0
+        self.sleep_time = 0.0
+        self._stalled_since = {}  # endpoint -> start of the current stall
+        self._cond = threading.Condition()
+
+    def acquire(self, endpoint):
+        """Block until a request to ``endpoint`` can be made and return
+        the number of the credential set to make it with.
+        """
+        with self._cond:
+            while True:
+                now = time.time()
+                buckets = [self.buckets[i, endpoint]
+                           for i in range(self.n_credentials)]
+                for bucket in buckets:
+                    bucket.refill(now)
+
+                best = max(range(self.n_credentials),
+                           key=lambda i: buckets[i].tokens)
+                if buckets[best].tokens >= 1:
+                    buckets[best].tokens -= 1
+                    self.requests += 1
+                    stalled_since = self._stalled_since.pop(endpoint, None)
+                    if stalled_since is not None:
+                        self.sleep_time += now - stalled_since
+                    return best
+
+                if endpoint not in self._stalled_since:
+                    self._stalled_since[endpoint] = now
+                    self.sleeps += 1
+                sleep_for = min(bucket.wait_time(now) for bucket in buckets)
+                self._cond.wait(sleep_for)
+
+    def update(self, i, endpoint, remaining, reset):
+        """Sync a bucket with the quota reported by the API. The reset time
+        is reported in whole seconds, so the bucket is blocked one extra 
+        second to make sure the window has actually been reset.
+        """
+        with self._cond:
+            bucket = self.buckets[i, endpoint]
+            bucket.tokens = min(bucket.tokens, remaining)
+            if remaining <= 0:
+                bucket.blocked_until = reset + 1
+
+    def exhaust(self, i, endpoint, reset):
+        """Mark a bucket empty until ``reset`` after a rate limit error"""
+        with self._cond:
+            self.rate_limited += 1
+            self.buckets[i, endpoint].tokens = 0.0
+            self.buckets[i, endpoint].blocked_until = reset
+
+    def metrics(self):
+        with self._cond:
+            now = time.time()
+            for bucket in self.buckets.values():
+                bucket.refill(now)
+            elapsed = max(now - self.started, 1e-9)
+
+            return {
+                'requests': self.requests,
+                'requests_per_s': self.requests / elapsed,
+                'rate_limited': self.rate_limited,
+                'sleeps': self.sleeps,
+                'sleep_time': self.sleep_time + sum(
+                    now - since for since in self._stalled_since.values()),
+                'headroom': {
+                    f'{i}:{endpoint}': bucket.tokens / bucket.limit
+                    for (i, endpoint), bucket in self.buckets.items()
+                },
+            }
@@ -28,4 +28,67 @@ class FrozenJSON:
         elif isinstance(obj, abc.MutableSequence):
             return [cls.build(item) for item in obj]
         else:
-            return obj
\ No newline at end of file
+            return obj
+
+class CompactFrozenJSON:
+    """A faster and leaner variant of ``FrozenJSON``, meant for navigating
+       millions of records. The mapping is wrapped without being copied,
+       and the wrappers of child mappings and lists are built once, on
+       first access, and memoized.
+    """
+
+    __slots__ = ('_data', '_children')
+
+    def __init__(self, mapping):
+        self._data = mapping
+        self._children = None
+
+    def __getattr__(self, name):
+        children = self._children
+        if children is None:
+            children = self._children = {}
+        elif name in children:
+            return children[name]
+
+        if hasattr(type(self._data), name):
+            return getattr(self._data, name)
+
+        child = children[name] = CompactFrozenJSON.build(self._data[name])
+        return child
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+    @classmethod
+    def build(cls, obj):
+        if isinstance(obj, abc.Mapping):
+            return cls(obj)
+        elif isinstance(obj, abc.MutableSequence):
+            return [cls.build(item) for item in obj]
+        else:
+            return obj
+
+
+def extract(records, paths):
+    """Extract columns of values from JSON-like records by dotted paths,
+       e.g. ``extract(tweets, ['user.screen_name', 'entities.hashtags'])``,
+       without wrapping any of the records. Values of missing paths are
+       ``None``.
+
+       :return: a dict of lists of values, keyed by path.
+    """
+    keys = [path.split('.') for path in paths]
+    columns = [[] for _ in paths]
+
+    for record in records:
+        for parts, column in zip(keys, columns):
+            value = record
+            for part in parts:
+                try:
+                    value = value[part]
+                except (KeyError, TypeError):
+                    value = None
+                    break
+            column.append(value)
+
+    return dict(zip(paths, columns))
@@ -1,31 +1,154 @@
-import xml.etree.cElementTree as ET
+import hashlib
+import json
+import os
+import xml.etree.ElementTree as ET
 import pandas as pd
 
+TOPIC_FIELDS = ['num', 'dataset', 'title', 'type', 'url', 'narr']
+
 
 class XMLTopicsParser():
 
     def __init__(self, topics_path):
         self.topics_path = topics_path
 
+    def iter_topics(self, chunk_size=1 << 16):
+        """Stream the topics as dicts of the text of their fields, in a
+        single pass with a pull parser. Topic files without a root element
+        (such as the 2020-A one) are parsed as if they had one.
+        """
+        parser = ET.XMLPullParser(events=('end',))
+        parser.feed('<topics>')
+
+        with open(self.topics_path, 'r', encoding='utf8') as fp:
+            chunk = fp.read(chunk_size)
+            # An XML declaration is only allowed at the very start
+            if chunk.lstrip().startswith('<?xml'):
+                chunk = chunk[chunk.index('?>') + 2:]
+
+            while chunk:
+                parser.feed(chunk)
+                yield from self._read_topics(parser)
+                chunk = fp.read(chunk_size)
+
+        parser.feed('</topics>')
+        yield from self._read_topics(parser)
+        parser.close()
+
+    def _read_topics(self, parser):
+        for _, node in parser.read_events():
+            if node.tag == 'top':
+                yield {child.tag: child.text for child in node}
+                node.clear()
+
     def parse_attribs(self, attribs) -> pd.DataFrame:
-        xtree = ET.parse(self.topics_path)
-        xroot = xtree.getroot()
-
-        rows = []  # Parsed results are stored here
-
-        for node in xroot: 
-            res = []
-            for el in attribs: 
-                if node is not None and node.find(el) is not None:
-                    res.append(node.find(el).text)
-                    # Sanity check
-                    # if el == 'num':
-                    #     print(node.find('num').text)
-                else: 
-                    res.append(None)
-
-            rows.append(
-                {attribs[i]: res[i] for i, _ in enumerate(attribs)}
-            )
-
-        return pd.DataFrame(rows, columns=attribs)
\ No newline at end of file
+        rows = [{el: topic.get(el) for el in attribs}
+                for topic in self.iter_topics()]
+
+        return pd.DataFrame(rows, columns=attribs)
+
+
+class TopicRegistry():
+    """Index of the topics of one or more TREC-IS editions (e.g. 2018-2019
+    and 2020-A), keyed by ``dataset`` for O(1) lookups. Parsed topic files
+    are cached on the hash of their content, in memory and, if a
+    ``cache_dir`` is given, on disk, so that later runs do not parse an
+    unchanged file again. File hashes are only recomputed when the size or
+    modification time of a file changes.
+    """
+
+    _cache = {}  # sha1 of file content -> DataFrame of its topics
+    _hashes = {}  # absolute path -> (size:mtime stamp, sha1)
+
+    HASHES_FILE = 'hashes.json'
+
+    def __init__(self, *topics_paths, cache_dir=None):
+        frames = [self.load(path, cache_dir) for path in topics_paths]
+        topics = pd.concat(frames, ignore_index=True)
+
+        # Later editions take precedence over earlier ones
+        self.topics = topics.drop_duplicates('dataset', keep='last')
+        self._index = {topic['dataset']: topic
+                       for topic in self.topics.to_dict('records')}
+
+    @classmethod
+    def load(cls, topics_path, cache_dir=None):
+        key = cls._hash(topics_path, cache_dir)
+
+        topics = cls._cache.get(key)
+        if topics is None and cache_dir is not None:
+            topics = cls._read_cached(os.path.join(cache_dir, key + '.json'))
+        if topics is None:
+            topics = XMLTopicsParser(topics_path).parse_attribs(TOPIC_FIELDS)
+            if cache_dir is not None:
+                _write_json(os.path.join(cache_dir, key + '.json'),
+                            topics.to_dict('records'))
+        cls._cache[key] = topics
+
+        # The edition depends on the path, not on the content
+        topics = topics.copy()
+        topics['edition'] = os.path.basename(topics_path).split('.')[0]
+        return topics
+
+    @classmethod
+    def _hash(cls, topics_path, cache_dir):
+        """Returns the sha1 of a file's content, reusing the hash last
+        computed for the path while its size and modification time are
+        unchanged"""
+        path = os.path.abspath(topics_path)
+        stat = os.stat(path)
+        stamp = f'{stat.st_size}:{stat.st_mtime_ns}'
+
+        hashes_path = (None if cache_dir is None
+                       else os.path.join(cache_dir, cls.HASHES_FILE))
+        if path not in cls._hashes and hashes_path is not None \
+                and os.path.exists(hashes_path):
+            with open(hashes_path, 'r', encoding='utf8') as fp:
+                for cached_path, entry in json.load(fp).items():
+                    cls._hashes.setdefault(cached_path, tuple(entry))
+
+        cached = cls._hashes.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                sha1.update(chunk)
+        cls._hashes[path] = (stamp, sha1.hexdigest())
+
+        if hashes_path is not None:
+            _write_json(hashes_path, cls._hashes)
+        return cls._hashes[path][1]
+
+    @staticmethod
+    def _read_cached(cache_path):
+        if not os.path.exists(cache_path):
+            return None
+        with open(cache_path, 'r', encoding='utf8') as fp:
+            return pd.DataFrame(json.load(fp), columns=TOPIC_FIELDS)
+
+    def __contains__(self, dataset):
+        return dataset in self._index
+
+    def __getitem__(self, dataset):
+        return self._index[dataset]
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, dataset, default=None):
+        return self._index.get(dataset, default)
+
+    def attribs(self, attribs) -> pd.DataFrame:
+        return self.topics[list(attribs)].reset_index(drop=True)
+
+
+def _write_json(path, obj):
+    """Write JSON to a temporary file first so that readers never see a
+    partially written file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf8') as fp:
+        json.dump(obj, fp)
+    os.replace(tmp_path, path)
@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tweepy
+
+from load_tweets import TweepyDownloader
+from rate_limits import LIMITS, RateLimitScheduler
+
+
+class StubTwitterServer():
+    """Local stand-in for the Twitter API ``statuses/lookup`` and
+    ``application/rate_limit_status`` endpoints, for running Tweet
+    hydration offline. Serves a fake Tweet for every requested id except
+    ``unavailable`` ones, and answers with HTTP 429 once ``limit``
+    lookups were made with the same bearer token within a ``window`` of 
+    seconds.
+    """
+
+    def __init__(self, limit=300, window=900, unavailable=(), latency=0.0):
+        self.limit = limit
+        self.window = window
+        self.unavailable = set(map(str, unavailable))
+        self.latency = latency
+        self.requests = 0
+
+        self._lock = threading.Lock()
+        self._quotas = {}  # token -> [remaining, reset]
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def quota(self, token):
+        """Return the remaining lookups and reset time of a token"""
+        now = time.time()
+        quota = self._quotas.setdefault(token, [self.limit, now + self.window])
+        if now >= quota[1]:
+            quota[:] = [self.limit, now + self.window]
+        return quota
+
+    def lookup(self, token, ids):
+        """Return the response status, headers and body of a lookup"""
+        with self._lock:
+            self.requests += 1
+            quota = self.quota(token)
+            if quota[0] <= 0:
+                return 429, {}, {'errors': [{'code': 88,
+                                             'message': 'Rate limit exceeded'}]}
+            quota[0] -= 1
+            headers = {'x-rate-limit-limit': str(self.limit),
+                       'x-rate-limit-remaining': str(quota[0]),
+                       'x-rate-limit-reset': str(int(quota[1]))}
+
+        time.sleep(self.latency)
+        return 200, headers, [{'id': int(id_), 'id_str': id_,
+                               'full_text': f'Tweet {id_}'}
+                              for id_ in ids if id_ not in self.unavailable]
+
+    def rate_limit_status(self, token):
+        with self._lock:
+            remaining, reset = self.quota(token)
+        lookup = {'limit': self.limit, 'remaining': remaining,
+                  'reset': int(reset)}
+        return 200, {}, {'resources': {'statuses': {'/statuses/lookup': lookup}}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                token = self.headers.get('Authorization', '')
+                if url.path == '/1.1/statuses/lookup.json':
+                    code, headers, body = server.lookup(
+                        token, query['id'][0].split(','))
+                elif url.path == '/1.1/application/rate_limit_status.json':
+                    code, headers, body = server.rate_limit_status(token)
+                else:
+                    code, headers, body = 404, {}, {'errors': [{'code': 34}]}
+
+                payload = json.dumps(body).encode()
+                self.send_response(code)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class StubStatus():
+    """Minimal stand-in for ``tweepy.Status`` holding the raw JSON"""
+
+    def __init__(self, json_):
+        self._json = json_
+
+
+class StubAPI():
+    """Client of a ``StubTwitterServer`` with the same interface as the
+    subset of ``tweepy.API`` used by ``TweepyDownloader``.
+    """
+
+    def __init__(self, url, token='stub'):
+        self.url = url
+        self.token = token
+        self.last_response = None
+
+    def _get(self, path, **params):
+        url = f'{self.url}{path}?{urllib.parse.urlencode(params)}'
+        request = urllib.request.Request(
+            url, headers={'Authorization': f'Bearer {self.token}'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                self.last_response = response
+                return json.load(response)
+        except urllib.error.HTTPError as err:
+            if err.code == 429:
+                raise tweepy.RateLimitError('Rate limit exceeded')
+            raise
+
+    def statuses_lookup(self, id_, **kwargs):
+        statuses = self._get('/1.1/statuses/lookup.json',
+                             id=','.join(map(str, id_)))
+        return [StubStatus(status) for status in statuses]
+
+    def rate_limit_status(self, resources=None):
+        return self._get('/1.1/application/rate_limit_status.json',
+                         resources=resources)
+
+
+class StubDownloader(TweepyDownloader):
+    """``TweepyDownloader`` pulling Tweets from a ``StubTwitterServer``
+    with ``n_credentials`` different bearer tokens
+    """
+
+    def __init__(self, url, n_credentials=1, limits=LIMITS):
+        self.apis = [StubAPI(url, f'stub{i}') for i in range(n_credentials)]
+        self.api = self.apis[0]
+        self.scheduler = RateLimitScheduler(n_credentials, limits)
+
@@ -0,0 +1,111 @@
+"""Offline checks of Tweet hydration and resuming against the stub API.
+
+    python -m pytest tests
+"""
+import json
+
+import pytest
+
+from load_tweets import hydrate, read_checkpoint
+from mock_api import StubDownloader, StubTwitterServer
+
+IDS = [str(i) for i in range(1000)]
+CHUNKS = [IDS[i:i + 100] for i in range(0, len(IDS), 100)]
+UNAVAILABLE = ['7', '42', '999']
+
+
+class Interrupted(Exception):
+    pass
+
+
+class CrashingDownloader(StubDownloader):
+    """Downloader failing on the chunk of Tweet ``crash_on``"""
+
+    def __init__(self, url, crash_on):
+        super().__init__(url)
+        self.crash_on = crash_on
+
+    def pull_tweets(self, tweet_ids, **lookup_kwargs):
+        if self.crash_on in tweet_ids:
+            raise Interrupted()
+        return super().pull_tweets(tweet_ids, **lookup_kwargs)
+
+
+def read_ids(output_path):
+    with open(output_path) as fp:
+        return [json.loads(line)['id_str'] for line in fp]
+
+
+def read_lines(checkpoint_path):
+    with open(checkpoint_path) as fp:
+        return [int(line) for line in fp]
+
+
+@pytest.fixture
+def server():
+    with StubTwitterServer(unavailable=UNAVAILABLE) as server:
+        yield server
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'tweets.jsonl'), str(tmp_path / 'tweets.checkpoint')
+
+
+def test_hydrate(server, paths):
+    output_path, checkpoint_path = paths
+    n_tweets = hydrate(CHUNKS, StubDownloader(server.url), output_path,
+                       checkpoint_path)
+
+    ids = read_ids(output_path)
+    assert n_tweets == len(ids) == len(IDS) - len(UNAVAILABLE)
+    assert sorted(ids, key=int) == [i for i in IDS if i not in UNAVAILABLE]
+    assert sorted(read_lines(checkpoint_path)) == list(range(len(CHUNKS)))
+    assert server.requests == len(CHUNKS)
+
+
+def test_resume_after_interruption(server, paths):
+    output_path, checkpoint_path = paths
+
+    # One lookup at a time, so that the chunks before the crash are saved
+    with pytest.raises(Interrupted):
+        hydrate(CHUNKS, CrashingDownloader(server.url, crash_on='650'),
+                output_path, checkpoint_path, max_workers=1)
+    assert read_checkpoint(checkpoint_path) == set(range(6))
+    assert len(read_ids(output_path)) == 600 - 2
+
+    hydrate(CHUNKS, StubDownloader(server.url), output_path, checkpoint_path)
+
+    ids = read_ids(output_path)
+    assert len(ids) == len(set(ids)) == len(IDS) - len(UNAVAILABLE)
+    # Every chunk is checkpointed exactly once, and only saved ones are
+    # looked up again
+    assert sorted(read_lines(checkpoint_path)) == list(range(len(CHUNKS)))
+    assert server.requests == len(CHUNKS)
+
+
+def test_resume_completed_run(server, paths):
+    output_path, checkpoint_path = paths
+    hydrate(CHUNKS[:4], StubDownloader(server.url), output_path,
+            checkpoint_path)
+    hydrate(CHUNKS, StubDownloader(server.url), output_path, checkpoint_path)
+    hydrate(CHUNKS, StubDownloader(server.url), output_path, checkpoint_path)
+
+    ids = read_ids(output_path)
+    assert len(ids) == len(set(ids)) == len(IDS) - len(UNAVAILABLE)
+    assert sorted(read_lines(checkpoint_path)) == list(range(len(CHUNKS)))
+
+
+def test_rate_limited_credentials(paths):
+    output_path, checkpoint_path = paths
+    limits = {'/statuses/lookup': (3, 1)}
+    with StubTwitterServer(limit=3, window=1) as server:
+        downloader = StubDownloader(server.url, n_credentials=2,
+                                    limits=limits)
+        hydrate(CHUNKS, downloader, output_path, checkpoint_path)
+
+    ids = read_ids(output_path)
+    assert len(ids) == len(set(ids)) == len(IDS)
+    metrics = downloader.scheduler.metrics()
+    assert metrics['requests'] == len(CHUNKS)
+    assert metrics['sleeps'] >= 1
@@ -1,9 +1,12 @@
+import os
+
 import matplotlib.pyplot as plt
 import numpy as np
 
 import skimage.io, skimage.color
 
 import PIL.Image
+import PIL.GifImagePlugin
 try:
     from StringIO import StringIO
 except ImportError:
@@ -12,15 +15,51 @@ import IPython.display
 import numpy as np
 
 
-def show_gif(a, width="100%"):
-    a = np.uint8(np.clip(a,0,1)*255.0)
-    f = StringIO()    
-    frames = []
-    for frame in range(a.shape[0]):
-        img = PIL.Image.fromarray(a[frame,...])
-        frames.append(img)
-    img.save(f, format='gif', save_all=True, append_images=frames, loop=0)
-    IPython.display.display(IPython.display.Image(data=f.getvalue(), width=width))
+def gif_frames(a, step=1):
+    """Convert every `step`-th frame of `a` (values in [0, 1]) to an image,
+    lazily, so that only one frame is converted at a time. """
+    for frame in range(0, a.shape[0], step):
+        yield PIL.Image.fromarray(np.uint8(np.clip(a[frame,...],0,1)*255.0))
+
+def write_gif(frames, f, duration=None, loop=0, reuse_palette=True):
+    """Encode images as an animated GIF into the binary file `f`, one frame
+    at a time rather than holding every frame in memory.
+
+    Grayscale frames are written with the gray palette. Colour frames are
+    quantized, to the palette of the first frame if `reuse_palette` (faster,
+    and a single global colour table), else each to its own palette. """
+    params = {} if duration is None else {'duration': duration}
+    palette = None
+    for img in frames:
+        first = palette is None
+        if img.mode not in ('L', 'P'):
+            img = img.convert('RGB')
+            if first or not reuse_palette:
+                img = img.quantize()
+            else:
+                img = img.quantize(palette=palette, dither=PIL.Image.Dither.NONE)
+        if first:
+            palette = img
+            header, _ = PIL.GifImagePlugin.getheader(img, info=dict(params, loop=loop))
+            f.writelines(header)
+        local_palette = not first and img.mode == 'P' and not reuse_palette
+        f.writelines(PIL.GifImagePlugin.getdata(img, include_color_table=local_palette, **params))
+    f.write(b';')
+
+def show_gif(a, width="100%", step=1, fname=None, duration=None, reuse_palette=True):
+    """Show the frames of `a` as an animated GIF, keeping every `step`-th 
+    frame. Frames are converted and encoded one at a time, into the file 
+    `fname` if given, else into memory. """
+    frames = gif_frames(a, step)
+    if fname is None:
+        f = StringIO()
+        write_gif(frames, f, duration=duration, reuse_palette=reuse_palette)
+        gif = IPython.display.Image(data=f.getvalue(), width=width)
+    else:
+        with open(fname, 'wb') as f:
+            write_gif(frames, f, duration=duration, reuse_palette=reuse_palette)
+        gif = IPython.display.Image(filename=fname, width=width)
+    IPython.display.display(gif)
 
 def show_image(a, fmt='png', width="100%"):
     a = np.uint8(np.clip(a,0,1)*255.0)
@@ -79,45 +118,165 @@ def plot_sound(audio):
     
     
         
-def load_obj(filename, swapyz=False):
-    """Loads a Wavefront OBJ file. """
-    vertices = []
-    normals = []
-    texcoords = []
-    faces = []
-
-    material = None
-    for line in open(filename, "r"):
-        if line.startswith('#'): continue
-        values = line.split()
-        if not values: continue
-        if values[0] == 'v':
-            v = map(float, values[1:4])
-            if swapyz:
-                v = v[0], v[2], v[1]
-            vertices.append(v)
-        elif values[0] == 'vn':
-            v = map(float, values[1:4])
-            if swapyz:
-                v = v[0], v[2], v[1]
-            normals.append(v)
-        elif values[0] == 'vt':
-            texcoords.append(map(float, values[1:3]))           
-        elif values[0] == 'f':
-            face = []
-            texcoords = []
-            norms = []
-            for v in values[1:]:
-                w = v.split('/')
-                face.append(int(w[0]))
-                if len(w) >= 2 and len(w[1]) > 0:
-                    texcoords.append(int(w[1]))
-                else:
-                    texcoords.append(0)
-                if len(w) >= 3 and len(w[2]) > 0:
-                    norms.append(int(w[2]))
-                else:
-                    norms.append(0)
-            faces.append((face, norms, texcoords, material))
-
-    return np.array(vertices), faces
\ No newline at end of file
+# Kinds of OBJ lines parsed by load_obj, by their first two bytes
+OBJ_KINDS = {b'v ': 'vertices', b'v\t': 'vertices', b'vn': 'normals',
+             b'vt': 'texcoords', b'f ': 'faces', b'f\t': 'faces'}
+OBJ_WIDTHS = {'vertices': 3, 'normals': 3, 'texcoords': 2}
+OBJ_PREFIXES = {'vertices': b'v', 'normals': b'vn', 'texcoords': b'vt'}
+
+def _obj_runs(data):
+    """Split the memory-mapped bytes of an OBJ file into runs of consecutive
+    lines of the same kind, as (kind, n_lines, start, end) byte ranges. """
+    ends = np.flatnonzero(data == ord('\n'))
+    if len(data) and data[-1] != ord('\n'):
+        ends = np.append(ends, len(data))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    padded = np.concatenate((data, np.zeros(2, np.uint8)))
+
+    # Lines are classified from their first non-blank byte, skipping one
+    # more byte of indentation per pass
+    indented = np.flatnonzero(np.isin(padded[starts], (ord(' '), ord('\t'))))
+    while len(indented):
+        starts[indented] += 1
+        indented = indented[(starts[indented] < ends[indented])
+                            & np.isin(padded[starts[indented]], (ord(' '), ord('\t')))]
+
+    # The first two bytes of each line, 0 past its end
+    first = np.where(ends > starts, padded[starts], 0).astype(np.uint16)
+    second = np.where(ends > starts + 1, padded[starts + 1], 0)
+    prefixes = first << 8 | second
+
+    codes = np.zeros(len(starts), np.int8)
+    names = sorted(set(OBJ_KINDS.values()))
+    for prefix, name in OBJ_KINDS.items():
+        codes[prefixes == (prefix[0] << 8 | prefix[1])] = names.index(name) + 1
+
+    breaks = np.flatnonzero(np.diff(codes)) + 1
+    for first_line, last_line in zip(np.r_[0, breaks], np.r_[breaks, len(codes)]):
+        if codes[first_line]:
+            yield (names[codes[first_line] - 1], last_line - first_line,
+                   starts[first_line], ends[last_line - 1])
+
+def _strip_obj_comments(chunk):
+    """Remove trailing `# ...` comments from the lines of a run. """
+    if b'#' not in chunk:
+        return chunk
+    return b'\n'.join(line.split(b'#', 1)[0] for line in chunk.split(b'\n'))
+
+def _parse_obj_floats(chunk, n_lines, prefix, width):
+    """Parse a run of `v`, `vn` or `vt` lines into an (n_lines, width) array. """
+    chunk = _strip_obj_comments(chunk)
+    try:
+        values = np.fromstring(chunk.replace(prefix, b' '), sep=' ')
+    except ValueError:
+        values = None
+    if values is not None and n_lines and len(values) % n_lines == 0 \
+            and len(values) // n_lines >= width:
+        return values.reshape(n_lines, -1)[:, :width]
+    # Lines with varying numbers of values, e.g. optional w or colours
+    return np.array([line.split()[1:width + 1] for line in chunk.splitlines()], dtype=np.float64)
+
+def _parse_obj_faces(chunk, counts):
+    """Parse a run of `f` lines into (n_faces, 3, 3) vertex, texcoord and
+    normal indices, 0-based and -1 where absent, splitting polygons into
+    triangle fans. `counts` are the numbers of each kind read so far, to
+    resolve negative (relative) indices. """
+    chunk = _strip_obj_comments(chunk)
+    group = chunk.split(None, 2)[1]
+    if b'//' in group:
+        layout = ['vertices', 'normals']
+    else:
+        layout = ['vertices', 'texcoords', 'normals'][:group.count(b'/') + 1]
+
+    # A 0 (never a valid index) marks the end of each line
+    text = chunk.replace(b'f', b' ').replace(b'/', b' ').replace(b'\n', b' 0\n')
+    lines = chunk.splitlines()
+    try:
+        values = np.fromstring(text + b' 0', dtype=np.int64, sep=' ')
+    except ValueError:
+        if len(lines) == 1:
+            raise ValueError("Malformed face in OBJ file: %r" % lines[0])
+        values = np.zeros(1, np.int64)  # parsed line by line below
+    line_ends = np.flatnonzero(values == 0)
+    sizes = np.diff(np.r_[-1, line_ends]) - 1
+    malformed = len(line_ends) != len(lines) or np.any(sizes % len(layout)) \
+        or np.any(sizes < 3 * len(layout))
+    if not malformed:
+        # Every group of every line must have the slashes of the first one,
+        # else e.g. `f 1 2 3 4 5 6` after `f 1/1 2/2 3/3` would be read as
+        # a triangle with texcoords
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        line_numbers = np.cumsum(data == ord('\n'))
+        slashes = np.bincount(line_numbers[data == ord('/')], minlength=len(lines))
+        malformed = np.any(slashes != sizes // len(layout) * group.count(b'/'))
+    if malformed:
+        if len(lines) > 1:
+            # Lines with different index layouts, parsed one by one
+            return np.concatenate([_parse_obj_faces(line, counts) for line in lines])
+        raise ValueError("Malformed face or face with fewer than 3 vertices "
+                         "in OBJ file: %r" % lines[0])
+    groups = np.delete(values, line_ends).reshape(-1, len(layout))
+    k = sizes // len(layout)
+
+    # Triangle fans (0, i, i+1) of every polygon, as group numbers
+    n_triangles = k - 2
+    base = np.repeat(np.cumsum(k) - k, n_triangles)
+    i = np.arange(n_triangles.sum()) - np.repeat(np.cumsum(n_triangles) - n_triangles, n_triangles) + 1
+    triangles = np.stack([base, base + i, base + i + 1], axis=1)
+
+    faces = np.full((len(triangles), 3, 3), -1, dtype=np.int64)
+    for column, kind in enumerate(layout):
+        indices = groups[:, column]
+        indices = np.where(indices > 0, indices - 1, counts[kind] + indices)
+        faces[:, :, ['vertices', 'texcoords', 'normals'].index(kind)] = indices[triangles]
+    return faces
+
+def load_obj(filename, swapyz=False, cache=True):
+    """Loads a Wavefront OBJ file into contiguous arrays, parsing each run of
+    lines of the same kind in bulk from a memory-mapped file.
+
+    Returns a dict of `vertices` (n, 3), `normals` (n, 3) and `texcoords`
+    (n, 2) float arrays, and of `faces`, `face_texcoords` and `face_normals`
+    (n_faces, 3) int arrays of 0-based indices into them (-1 where a face
+    has none). Polygons are split into triangles.
+
+    With `cache`, the arrays are saved to a `.npz` sidecar next to the file
+    and loaded from it while the OBJ file is unchanged. """
+    stat = os.stat(filename)
+    stamp = np.array([stat.st_size, stat.st_mtime_ns])
+    sidecar = filename + '.npz'
+
+    mesh = None
+    if cache and os.path.exists(sidecar):
+        with np.load(sidecar) as npz:
+            if np.array_equal(npz['stamp'], stamp):
+                mesh = {name: npz[name] for name in npz.files if name != 'stamp'}
+
+    if mesh is None:
+        parts = {name: [] for name in ['vertices', 'normals', 'texcoords', 'faces']}
+        counts = dict.fromkeys(parts, 0)
+        data = np.memmap(filename, dtype=np.uint8, mode='r') if stat.st_size else np.zeros(0, np.uint8)
+        for kind, n_lines, start, end in _obj_runs(data):
+            chunk = data[start:end].tobytes()
+            if kind == 'faces':
+                part = _parse_obj_faces(chunk, counts)
+            else:
+                part = _parse_obj_floats(chunk, n_lines, OBJ_PREFIXES[kind], OBJ_WIDTHS[kind])
+            parts[kind].append(part)
+            counts[kind] += len(part)
+        del data
+
+        mesh = {kind: np.ascontiguousarray(np.concatenate(parts[kind]) if parts[kind]
+                                           else np.zeros((0, OBJ_WIDTHS[kind])))
+                for kind in OBJ_WIDTHS}
+        faces = np.concatenate(parts['faces']) if parts['faces'] else np.zeros((0, 3, 3), np.int64)
+        for i, name in enumerate(['faces', 'face_texcoords', 'face_normals']):
+            mesh[name] = np.ascontiguousarray(faces[:, :, i])
+        if cache:
+            np.savez(sidecar, stamp=stamp, **mesh)
+
+    if swapyz:
+        mesh['vertices'] = np.ascontiguousarray(mesh['vertices'][:, [0, 2, 1]])
+        mesh['normals'] = np.ascontiguousarray(mesh['normals'][:, [0, 2, 1]])
+    return mesh
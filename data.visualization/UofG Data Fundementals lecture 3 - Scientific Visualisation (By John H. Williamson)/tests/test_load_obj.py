@@ -0,0 +1,65 @@
+"""Regression checks of the bulk OBJ parser of image_audio.py.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+for module in ('matplotlib', 'skimage', 'IPython'):
+    pytest.importorskip(module)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from image_audio import load_obj  # noqa: E402
+
+
+def write_obj(tmp_path, text):
+    path = tmp_path / 'mesh.obj'
+    path.write_text(text)
+    return str(path)
+
+
+def test_faces_with_different_layouts_in_one_run(tmp_path):
+    vertices = ''.join(f'v {i} 0 0\n' for i in range(6))
+    texcoords = ''.join(f'vt {i} 0\n' for i in range(6))
+    mesh = load_obj(write_obj(tmp_path, vertices + texcoords
+                              + 'f 1/1 2/2 3/3\nf 1 2 3 4 5 6\n'), cache=False)
+
+    # The hexagon is split into 4 triangles without texcoords
+    assert mesh['faces'].tolist() == [[0, 1, 2], [0, 1, 2], [0, 2, 3],
+                                      [0, 3, 4], [0, 4, 5]]
+    assert mesh['face_texcoords'].tolist() == [[0, 1, 2]] + [[-1] * 3] * 4
+
+
+def test_comments_and_indentation(tmp_path):
+    mesh = load_obj(write_obj(tmp_path, '# header\n'
+                                        'v 0 0 0 # a\n'
+                                        '  v 1 0 0\n'
+                                        '\tv 0 1 0\n'
+                                        'vn 0 0 1 # n\n'
+                                        'f 1//1 2//1 3//1 # c\n'), cache=False)
+
+    assert mesh['vertices'].tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+    assert mesh['faces'].tolist() == [[0, 1, 2]]
+    assert mesh['face_normals'].tolist() == [[0, 0, 0]]
+    assert mesh['face_texcoords'].tolist() == [[-1, -1, -1]]
+
+
+def test_mixed_layout_within_a_face(tmp_path):
+    with pytest.raises(ValueError):
+        load_obj(write_obj(tmp_path, 'v 0 0 0\nv 1 0 0\nv 0 1 0\n'
+                                     'f 1/1 2 3\n'), cache=False)
+
+
+def test_cache(tmp_path):
+    path = write_obj(tmp_path, 'v 0 0 0\nv 1 0 0\nv 0 1 0\nv 1 1 0\n'
+                               'f 1 2 3 4\n')
+    first = load_obj(path)
+    assert os.path.exists(path + '.npz')
+    second = load_obj(path)
+    for name, values in first.items():
+        np.testing.assert_array_equal(values, second[name])
+    assert second['faces'].tolist() == [[0, 1, 2], [0, 2, 3]]
@@ -0,0 +1,79 @@
+"""Compare the time and peak memory of training AdalineGD and the
+'minibatch' Perceptron in float64 and float32, with and without reusing
+preallocated buffers.
+
+    python benchmarks/bench_linear_precision.py --n-examples 1000000 --n-features 100
+
+The training vectors are generated in each dtype beforehand, so that the
+peak memory only covers training.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+models = os.path.join(os.path.dirname(__file__), '..', 'models')
+sys.path.insert(0, os.path.join(models, 'perceptron'))
+sys.path.insert(0, os.path.join(models, 'adaline'))
+
+from adaline import AdalineGD  # noqa: E402
+from perceptron import Perceptron  # noqa: E402
+
+
+def make_data(n_examples, n_features, seed=1):
+    rgen = np.random.RandomState(seed)
+    X = rgen.normal(size=(n_examples, n_features))
+    w = rgen.normal(size=n_features)
+    y = np.where(X.dot(w) >= 0.0, 1, -1)
+    return X, y
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    # Memory is traced in a separate run, since tracing slows it down
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-examples', type=int, default=1000000)
+    parser.add_argument('--n-features', type=int, default=100)
+    parser.add_argument('--n-iter', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    X, y = make_data(args.n_examples, args.n_features)
+    print(f'{args.n_examples}x{args.n_features} examples, '
+          f'{args.n_iter} epochs')
+
+    for dtype in (np.float64, np.float32):
+        Xd, yd = X.astype(dtype), y.astype(dtype)
+        for reuse_buffers in (False, True):
+            cases = [
+                ('AdalineGD', AdalineGD(
+                    eta=0.1 / args.n_examples, n_iter=args.n_iter,
+                    dtype=dtype, reuse_buffers=reuse_buffers)),
+                ('Perceptron', Perceptron(
+                    n_iter=args.n_iter, solver='minibatch',
+                    batch_size=args.batch_size, dtype=dtype,
+                    reuse_buffers=reuse_buffers)),
+            ]
+            for name, model in cases:
+                elapsed, peak = timed(lambda: model.fit(Xd, yd))
+                mode = 'reuse' if reuse_buffers else 'alloc'
+                print(f'{name:>10} {np.dtype(dtype).name:>7} {mode}: '
+                      f'{elapsed:6.2f}s, peak {peak / 2 ** 20:7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compare the training solvers of Perceptron on synthetic, linearly
+separable data.
+
+    python benchmarks/bench_perceptron.py --n-examples 1000000 --n-features 100
+
+The 'online' reference solver loops over examples in Python and takes
+minutes per epoch at that size; leave it out with --solvers.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models', 'perceptron'))
+
+from perceptron import Perceptron  # noqa: E402
+
+
+def make_data(n_examples, n_features, seed=1):
+    rgen = np.random.RandomState(seed)
+    X = rgen.normal(size=(n_examples, n_features))
+    w = rgen.normal(size=n_features)
+    y = np.where(X.dot(w) >= 0.0, 1, -1)
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-examples', type=int, default=1000000)
+    parser.add_argument('--n-features', type=int, default=100)
+    parser.add_argument('--n-iter', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--solvers', nargs='+',
+                        default=['online', 'fused', 'minibatch'])
+    args = parser.parse_args()
+
+    X, y = make_data(args.n_examples, args.n_features)
+    print(f'{args.n_examples}x{args.n_features} examples, '
+          f'{args.n_iter} epochs')
+
+    if 'fused' in args.solvers:
+        # Compile the kernel outside of the timed run
+        Perceptron(n_iter=1, solver='fused').fit(X[:10], y[:10])
+
+    for solver in args.solvers:
+        ppn = Perceptron(n_iter=args.n_iter, solver=solver,
+                         batch_size=args.batch_size)
+        start = time.perf_counter()
+        ppn.fit(X, y)
+        elapsed = time.perf_counter() - start
+        accuracy = np.mean(ppn.predict(X) == y)
+        print(f'{solver:>10}: {elapsed:8.2f}s, accuracy {accuracy:.4f}, '
+              f'errors_ {ppn.errors_}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,27 @@
+import time
+
 import numpy as np
 
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+
+def _issparse(X):
+    return sp is not None and sp.issparse(X)
+
+
+def _add_sparse_dot(w, X, v):
+    """Add ``X.T.dot(v)`` to ``w`` in place for a CSR matrix ``X``, touching
+    only the weights of its nonzero entries rather than all n_features"""
+    np.add.at(w, X.indices, X.data * np.repeat(v, np.diff(X.indptr)))
+
 
 class AdalineGD(object):
     """ADAptive LInear NEuron classifier.
+    Training and prediction also accept `scipy.sparse` matrices (e.g.
+    bag-of-words features), touching only their nonzero entries.
     Parameters
     ------------
     eta : float
@@ -12,23 +31,71 @@ class AdalineGD(object):
     random_state : int
       Random number generator seed for random weight
       initialization.
+    batch_size : int
+      Number of examples per weight update of `partial_fit` and
+      `fit_stream`.
+    shuffle_buffer : int
+      Number of examples `fit_stream` gathers from consecutive chunks
+      and shuffles before training on them (0 for no shuffling).
+    learning_rate : {'constant', 'invscaling'} or callable
+      Learning rate schedule of `fit_stream`: `eta` in every epoch,
+      `eta / (epoch + 1) ** power_t`, or a callable of the epoch
+      number returning the learning rate.
+    power_t : float
+      Exponent of the 'invscaling' learning rate schedule.
+    dtype : data-type
+      Floating point type of the weights, which training vectors are
+      converted to as well. np.float32 halves the memory and memory
+      bandwidth of training, at the cost of precision.
+    reuse_buffers : bool
+      Preallocate the net input, error and gradient buffers once per
+      `fit` (or chunk) and update them in place, instead of allocating
+      new temporaries in every epoch (or batch). Ignored for sparse
+      input.
+    tol : float or None
+      Stop `fit` and `fit_stream` once the cost has not dropped by more
+      than `tol` below its best value for `patience` epochs in a row
+      (None to disable).
+    patience : int
+      Number of epochs without improvement tolerated by `tol`.
+    callback : callable or None
+      Called as `callback(model, info)` after every epoch, with `info`
+      a dict of the 'epoch' number, its wall 'time' in seconds and its
+      'cost'. Training stops if it returns True.
     Attributes
     -----------
     w_ : 1d-array
       Weights after fitting.
     cost_ : list
       Sum-of-squares cost function value in each epoch.
+    epoch_times_ : list
+      Wall time in seconds of each epoch.
+    n_iter_ : int
+      Number of epochs actually run.
     """
-    def __init__(self, eta=0.01, n_iter=50, random_state=1):
+    def __init__(self, eta=0.01, n_iter=50, random_state=1, batch_size=32,
+                 shuffle_buffer=0, learning_rate='constant', power_t=0.5,
+                 dtype=np.float64, reuse_buffers=False, tol=None,
+                 patience=1, callback=None):
         self.eta = eta
         self.n_iter = n_iter
         self.random_state = random_state
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.learning_rate = learning_rate
+        self.power_t = power_t
+        self.dtype = dtype
+        self.reuse_buffers = reuse_buffers
+        self.tol = tol
+        self.patience = patience
+        self.callback = callback
+        self.w_initialized = False
 
     def fit(self, X, y):
         """ Fit training data.
         Parameters
         ----------
-        X : {array-like}, shape = [n_examples, n_features]
+        X : {array-like, sparse matrix}, shape = [n_examples, n_features]
           Training vectors, where n_examples is the number of examples and
           n_features is the number of features.
         y : array-like, shape = [n_examples]
@@ -37,11 +104,21 @@ class AdalineGD(object):
         -------
         self : object
         """
-        rgen = np.random.RandomState(self.random_state)
-        self.w_ = rgen.normal(loc=0.0, scale=0.01, size=1 + X.shape[1])
-        self.cost_ = []
+        self._initialize_weights(X.shape[1])
+        X, y = self._as_dtype(X, y)
+
+        if self.reuse_buffers and not _issparse(X):
+            errors = np.empty(X.shape[0], dtype=self.dtype)
+            grad = np.empty(X.shape[1], dtype=self.dtype)
+            for i in range(self.n_iter):
+                started = time.perf_counter()
+                cost = self._update_inplace(X, y, self.eta, errors, grad)
+                if self._end_epoch(i, started, cost):
+                    break
+            return self
 
         for i in range(self.n_iter):
+            started = time.perf_counter()
             net_input = self.net_input(X)
             # Please note that the "activation" method has no effect
             # in the code since it is simply an identity function. We
@@ -55,11 +132,188 @@ class AdalineGD(object):
             self.w_[1:] += self.eta * X.T.dot(errors)
             self.w_[0] += self.eta * errors.sum()
             cost = (errors**2).sum() / 2.0
-            self.cost_.append(cost)
+            if self._end_epoch(i, started, cost):
+                break
         return self
 
+    def partial_fit(self, X, y):
+        """Fit a chunk of training data with mini-batch stochastic
+        gradient descent, without reinitializing the weights.
+        Parameters
+        ----------
+        X : {array-like, sparse matrix}, shape = [n_examples, n_features]
+        y : array-like, shape = [n_examples]
+        Returns
+        -------
+        self : object
+        """
+        if not self.w_initialized:
+            self._initialize_weights(X.shape[1])
+        self._update_weights(X, y, self.eta)
+        return self
+
+    def fit_stream(self, chunks):
+        """Fit training data that does not fit in memory, streamed in
+        chunks, with mini-batch stochastic gradient descent.
+        Parameters
+        ----------
+        chunks : callable
+          Returns a new iterator of (X, y) chunks of the training data
+          on every call, i.e. once per epoch. For example, over a CSV
+          file read with pandas:
+
+            def chunks():
+                for df in pd.read_csv(path, chunksize=10000):
+                    yield df[features].values, df[target].values
+
+          or over memory-mapped .npy shards, `npy_shards(X_paths, y_paths)`.
+        Returns
+        -------
+        self : object
+        """
+        self._initialize_weights(None)
+
+        for i in range(self.n_iter):
+            started = time.perf_counter()
+            eta = self._eta(i)
+            cost = 0.0
+            for X, y in self._shuffled(chunks()):
+                if not self.w_initialized:
+                    self._initialize_weights(X.shape[1])
+                cost += self._update_weights(X, y, eta)
+            if self._end_epoch(i, started, cost):
+                break
+        return self
+
+    def _initialize_weights(self, m):
+        """Initialize weights to small random numbers, or reset them until
+        the number of features `m` is known"""
+        self.rgen = np.random.RandomState(self.random_state)
+        self.cost_ = []
+        self.epoch_times_ = []
+        self.n_iter_ = 0
+        self._best_cost, self._n_no_change = np.inf, 0
+        self.w_initialized = m is not None
+        if self.w_initialized:
+            self.w_ = self.rgen.normal(loc=0.0, scale=0.01,
+                                       size=1 + m).astype(self.dtype)
+
+    def _end_epoch(self, epoch, started, cost):
+        """Record an epoch, report it to `callback` and return whether
+        training should stop"""
+        elapsed = time.perf_counter() - started
+        self.cost_.append(cost)
+        self.epoch_times_.append(elapsed)
+        self.n_iter_ = epoch + 1
+
+        stop = False
+        if self.tol is not None:
+            if cost > self._best_cost - self.tol:
+                self._n_no_change += 1
+            else:
+                self._n_no_change = 0
+            self._best_cost = min(self._best_cost, cost)
+            stop = self._n_no_change >= self.patience
+
+        if self.callback is not None:
+            info = {'epoch': epoch, 'time': elapsed, 'cost': cost}
+            stop = bool(self.callback(self, info)) or stop
+        return stop
+
+    def _as_dtype(self, X, y):
+        """Convert training data to `dtype`, without copying it if it
+        already is"""
+        if _issparse(X):
+            X = X.tocsr().astype(self.dtype, copy=False)
+        else:
+            X = np.asarray(X, dtype=self.dtype)
+        return X, np.asarray(y, dtype=self.dtype)
+
+    def _update_weights(self, X, y, eta):
+        """Apply the Adaline learning rule per mini-batch and return the
+        sum-of-squares cost over the chunk"""
+        X, y = self._as_dtype(X, y)
+        if self.reuse_buffers and not _issparse(X):
+            errors = np.empty(min(self.batch_size, X.shape[0]),
+                              dtype=self.dtype)
+            grad = np.empty(X.shape[1], dtype=self.dtype)
+            cost = 0.0
+            for start in range(0, X.shape[0], self.batch_size):
+                xb = X[start:start + self.batch_size]
+                cost += self._update_inplace(
+                    xb, y[start:start + self.batch_size], eta,
+                    errors[:xb.shape[0]], grad)
+            return cost
+
+        cost = 0.0
+        for start in range(0, X.shape[0], self.batch_size):
+            xb = X[start:start + self.batch_size]
+            errors = (y[start:start + self.batch_size]
+                      - self.activation(self.net_input(xb)))
+            if _issparse(xb):
+                _add_sparse_dot(self.w_[1:], xb, eta * errors)
+            else:
+                self.w_[1:] += eta * xb.T.dot(errors)
+            self.w_[0] += eta * errors.sum()
+            cost += (errors**2).sum() / 2.0
+        return cost
+
+    def _update_inplace(self, X, y, eta, errors, grad):
+        """Apply the Adaline learning rule to all of X at once, computing
+        the net input, errors and gradient in the `errors` and `grad`
+        buffers, and return the sum-of-squares cost"""
+        np.dot(X, self.w_[1:], out=errors)
+        errors += self.w_[0]
+        output = self.activation(errors)
+        np.subtract(y, output, out=errors)
+        np.dot(errors, X, out=grad)
+        grad *= eta
+        self.w_[1:] += grad
+        self.w_[0] += eta * errors.sum()
+        return np.dot(errors, errors) / 2.0
+
+    def _shuffled(self, chunks):
+        """Shuffle examples within buffers of `shuffle_buffer` examples"""
+        if not self.shuffle_buffer:
+            yield from chunks
+            return
+
+        buffer, n_buffered = [], 0
+        for X, y in chunks:
+            if not _issparse(X):
+                X = np.asarray(X)
+            buffer.append((X, np.asarray(y)))
+            n_buffered += len(y)
+            if n_buffered >= self.shuffle_buffer:
+                yield self._shuffle(buffer)
+                buffer, n_buffered = [], 0
+        if buffer:
+            yield self._shuffle(buffer)
+
+    def _shuffle(self, buffer):
+        if _issparse(buffer[0][0]):
+            X = sp.vstack([X for X, _ in buffer], format='csr')
+        else:
+            X = np.concatenate([X for X, _ in buffer])
+        y = np.concatenate([y for _, y in buffer])
+        r = self.rgen.permutation(len(y))
+        return X[r], y[r]
+
+    def _eta(self, epoch):
+        """Learning rate of an epoch according to the schedule"""
+        if callable(self.learning_rate):
+            return self.learning_rate(epoch)
+        if self.learning_rate == 'invscaling':
+            return self.eta / (epoch + 1) ** self.power_t
+        if self.learning_rate == 'constant':
+            return self.eta
+        raise ValueError("learning_rate must be 'constant', 'invscaling' "
+                         "or a callable, got %r" % (self.learning_rate,))
+
     def net_input(self, X):
         """Calculate net input"""
+        if _issparse(X):
+            return X.dot(self.w_[1:]) + self.w_[0]
         return np.dot(X, self.w_[1:]) + self.w_[0]
 
     def activation(self, X):
@@ -68,4 +322,16 @@ class AdalineGD(object):
 
     def predict(self, X):
         """Return class label after unit step"""
-        return np.where(self.activation(self.net_input(X)) >= 0.0, 1, -1)
\ No newline at end of file
+        return np.where(self.activation(self.net_input(X)) >= 0.0, 1, -1)
+
+
+def npy_shards(X_paths, y_paths):
+    """Return a callable streaming (X, y) chunks from pairs of .npy files,
+    memory-mapped so that only the examples in use are read into memory.
+    Pass it to `AdalineGD.fit_stream`.
+    """
+    def chunks():
+        for X_path, y_path in zip(X_paths, y_paths):
+            yield (np.load(X_path, mmap_mode='r'),
+                   np.load(y_path, mmap_mode='r'))
+    return chunks
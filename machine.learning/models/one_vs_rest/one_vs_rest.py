@@ -0,0 +1,202 @@
+import inspect
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+
+def clone(estimator, **params):
+    """Construct a new unfitted estimator with the same constructor
+    parameters as `estimator`, except for those overridden in `params`."""
+    names = inspect.signature(type(estimator).__init__).parameters
+    kwargs = {name: getattr(estimator, name) for name in names
+              if name != 'self' and hasattr(estimator, name)}
+    kwargs.update(params)
+    return type(estimator)(**kwargs)
+
+
+def param_combinations(param_grid):
+    """List every combination of a dict of parameter value lists"""
+    names = sorted(param_grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(param_grid[n] for n in names))]
+
+
+def _split(n_examples, validation_fraction, random_state):
+    r = np.random.RandomState(random_state).permutation(n_examples)
+    n_validation = int(n_examples * validation_fraction)
+    return np.sort(r[n_validation:]), np.sort(r[:n_validation])
+
+
+def _issparse(X):
+    return sp is not None and sp.issparse(X)
+
+
+def _save_X(tmp_dir, X):
+    """Save training vectors to .npy files for the worker processes to
+    memory-map: a dense array as is, a scipy.sparse matrix as the arrays
+    of its CSR format. Returns what `_load_X` needs to read them back."""
+    if not _issparse(X):
+        path = os.path.join(tmp_dir, 'X.npy')
+        np.save(path, np.asarray(X))
+        return path, None
+
+    X = X.tocsr()
+    if not X.has_canonical_format:
+        X = X.copy()
+        X.sum_duplicates()
+    paths = []
+    for name in ('data', 'indices', 'indptr'):
+        paths.append(os.path.join(tmp_dir, 'X_%s.npy' % name))
+        np.save(paths[-1], getattr(X, name))
+    return paths, X.shape
+
+
+def _load_X(paths, shape):
+    if shape is None:
+        return np.load(paths, mmap_mode='r')
+    arrays = [np.load(path, mmap_mode='r') for path in paths]
+    return sp.csr_matrix(tuple(arrays), shape=shape)
+
+
+def _fit_output(estimator, X_paths, X_shape, Y_path, column,
+                validation_fraction, random_state):
+    """Fit a binary estimator for one output column, reading the data from
+    memory-mapped .npy files so that worker processes share it. Returns
+    the fitted weights and, with a validation split, the accuracy on it.
+    """
+    X = _load_X(X_paths, X_shape)
+    y = np.where(np.load(Y_path, mmap_mode='r')[:, column] > 0, 1, -1)
+
+    if not validation_fraction:
+        estimator.fit(X, y)
+        return estimator.w_, None
+
+    train, validation = _split(len(y), validation_fraction, random_state)
+    estimator.fit(X[train], y[train])
+    score = np.mean(estimator.predict(X[validation]) == y[validation])
+    return estimator.w_, score
+
+
+class OneVsRestClassifier(object):
+    """One-vs-rest classifier for multi-label (or multi-class) targets
+    built from binary linear models such as Perceptron and AdalineGD.
+
+    Parameters
+    ------------
+    estimator : object
+      Binary model with `fit`, `predict` and a `w_` weight vector (bias
+      first) after fitting, cloned for every output.
+    param_grid : dict
+      Lists of constructor parameter values to sweep (e.g. `eta` and
+      `n_iter`). Every combination is fitted for every output on a
+      training split; the best one on the validation split is refitted
+      on all the data.
+    validation_fraction : float
+      Fraction of examples held out to compare parameter combinations.
+    n_jobs : int
+      Number of worker processes (-1 for all cores).
+    random_state : int
+      Random number generator seed for the validation split.
+
+    Attributes
+    -----------
+    W_ : 2d-array, shape = [1 + n_features, n_outputs]
+      Weights of all outputs after fitting, bias in the first row.
+    classes_ : 1d-array
+      Class labels, if `fit` was given a 1-D multi-class target.
+    best_params_ : list
+      Parameters chosen for each output.
+    scores_ : 2d-array, shape = [n_combinations, n_outputs]
+      Validation accuracy of each parameter combination and output.
+    """
+    def __init__(self, estimator, param_grid=None, validation_fraction=0.2,
+                 n_jobs=-1, random_state=1):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.validation_fraction = validation_fraction
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def fit(self, X, Y):
+        """Fit a binary model per output.
+
+        Parameters
+        ----------
+        X : {array-like, sparse matrix}, shape = [n_examples, n_features]
+          Training vectors.
+        Y : array-like, shape = [n_examples, n_outputs] or [n_examples]
+          Binary (0/1) indicators of each output, e.g. the one-hot post
+          categories, or class labels.
+
+        Returns
+        -------
+        self : object
+        """
+        Y = np.asarray(Y)
+        self.classes_ = None
+        if Y.ndim == 1:
+            self.classes_, codes = np.unique(Y, return_inverse=True)
+            Y = np.eye(len(self.classes_), dtype=np.int8)[codes]
+        n_outputs = Y.shape[1]
+
+        combinations = param_combinations(self.param_grid or {})
+        if len(combinations) > 1 and not self.validation_fraction:
+            raise ValueError('validation_fraction must be positive to '
+                             'compare the param_grid combinations')
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            X_paths, X_shape = _save_X(tmp_dir, X)
+            Y_path = os.path.join(tmp_dir, 'Y.npy')
+            np.save(Y_path, Y)
+
+            def fit_outputs(tasks, validation_fraction):
+                # Submit every (params, output) task before waiting on any
+                futures = [executor.submit(
+                    _fit_output, clone(self.estimator, **params), X_paths,
+                    X_shape, Y_path, k, validation_fraction,
+                    self.random_state)
+                    for params, k in tasks]
+                return [future.result() for future in futures]
+
+            if len(combinations) > 1:
+                tasks = [(params, k) for params in combinations
+                         for k in range(n_outputs)]
+                scores = [score for _, score in 
+                          fit_outputs(tasks, self.validation_fraction)]
+                self.scores_ = np.array(scores).reshape(len(combinations), 
+                                                        n_outputs)
+                best = self.scores_.argmax(axis=0)
+                self.best_params_ = [combinations[i] for i in best]
+            else:
+                self.scores_ = None
+                self.best_params_ = combinations * n_outputs
+
+            weights = fit_outputs(zip(self.best_params_, range(n_outputs)), 
+                                  None)
+
+        self.W_ = np.column_stack([w for w, _ in weights])
+        return self
+
+    def decision_function(self, X):
+        """Calculate net input of all outputs with a single matrix product"""
+        if _issparse(X):
+            return X.dot(self.W_[1:]) + self.W_[0]
+        return np.dot(X, self.W_[1:]) + self.W_[0]
+
+    def predict(self, X):
+        """Return 0/1 indicators of every output, or class labels if the
+        model was fitted on class labels"""
+        net_input = self.decision_function(X)
+        if self.classes_ is not None:
+            return self.classes_[net_input.argmax(axis=1)]
+        return (net_input >= 0.0).astype(np.int8)
@@ -1,9 +1,130 @@
+import time
+
 import numpy as np
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+
+def _fit_online_kernel(X, y, w, eta, n_iter, errors):
+    """All epochs of the classic online rule as plain loops, compiled with
+    numba when it is installed. Updates ``w`` and ``errors`` in place.
+    """
+    n_examples, n_features = X.shape
+    for epoch in range(n_iter):
+        n_errors = 0
+        for i in range(n_examples):
+            net_input = w[0]
+            for j in range(n_features):
+                net_input += X[i, j] * w[j + 1]
+            prediction = 1.0 if net_input >= 0.0 else -1.0
+            update = eta * (y[i] - prediction)
+            if update != 0.0:
+                for j in range(n_features):
+                    w[j + 1] += update * X[i, j]
+                w[0] += update
+                n_errors += 1
+        errors[epoch] = n_errors
+
+
+def _fit_online_numpy(X, y, w, eta, n_iter, errors):
+    """Fallback of ``_fit_online_kernel`` without numba, still looping over
+    examples but without the overhead of ``predict`` per example.
+    """
+    for epoch in range(n_iter):
+        n_errors = 0
+        for xi, target in zip(X, y):
+            prediction = 1.0 if xi.dot(w[1:]) + w[0] >= 0.0 else -1.0
+            update = eta * (target - prediction)
+            if update != 0.0:
+                w[1:] += update * xi
+                w[0] += update
+                n_errors += 1
+        errors[epoch] = n_errors
+
+
+def _fit_online_sparse_kernel(indptr, indices, data, y, w, eta, n_iter,
+                              errors):
+    """``_fit_online_kernel`` over the arrays of a CSR matrix, touching only
+    the nonzero features of each example.
+    """
+    n_examples = indptr.shape[0] - 1
+    for epoch in range(n_iter):
+        n_errors = 0
+        for i in range(n_examples):
+            net_input = w[0]
+            for k in range(indptr[i], indptr[i + 1]):
+                net_input += data[k] * w[indices[k] + 1]
+            prediction = 1.0 if net_input >= 0.0 else -1.0
+            update = eta * (y[i] - prediction)
+            if update != 0.0:
+                for k in range(indptr[i], indptr[i + 1]):
+                    w[indices[k] + 1] += update * data[k]
+                w[0] += update
+                n_errors += 1
+        errors[epoch] = n_errors
+
+
+def _fit_online_sparse_numpy(indptr, indices, data, y, w, eta, n_iter,
+                             errors):
+    """Fallback of ``_fit_online_sparse_kernel`` without numba"""
+    for epoch in range(n_iter):
+        n_errors = 0
+        for i in range(len(y)):
+            columns = indices[indptr[i]:indptr[i + 1]] + 1
+            values = data[indptr[i]:indptr[i + 1]]
+            prediction = 1.0 if values.dot(w[columns]) + w[0] >= 0.0 else -1.0
+            update = eta * (y[i] - prediction)
+            if update != 0.0:
+                w[columns] += update * values
+                w[0] += update
+                n_errors += 1
+        errors[epoch] = n_errors
+
+
+if numba is not None:
+    _fit_fused = numba.njit(cache=True)(_fit_online_kernel)
+    _fit_fused_sparse = numba.njit(cache=True)(_fit_online_sparse_kernel)
+else:
+    _fit_fused = _fit_online_numpy
+    _fit_fused_sparse = _fit_online_sparse_numpy
+
+
+def _issparse(X):
+    return sp is not None and sp.issparse(X)
+
+
+def _as_csr(X):
+    """Convert a scipy.sparse matrix to CSR without duplicate entries, as
+    the sparse solvers index the weights by the column of each entry"""
+    X = X.tocsr()
+    if not X.has_canonical_format:
+        X = X.copy()
+        X.sum_duplicates()
+    return X
+
+
+def _add_sparse_dot(w, X, v):
+    """Add ``X.T.dot(v)`` to ``w`` in place for a CSR matrix ``X``, touching
+    only the weights of its nonzero entries rather than all n_features"""
+    np.add.at(w, X.indices, X.data * np.repeat(v, np.diff(X.indptr)))
+
 
 class Perceptron(object):
     """Perceptron classifier.
 
+    Training and prediction also accept a `scipy.sparse` matrix (e.g.
+    bag-of-words features), touching only its nonzero entries, so that
+    time and memory scale with the number of nonzeros rather than
+    with n_features.
+
     Parameters
     ------------
     eta : float
@@ -13,6 +134,38 @@ class Perceptron(object):
     random_state : int
       Random number generator seed for random weight
       initialization.
+    solver : {'online', 'fused', 'minibatch'}
+      Training engine. 'online' is the classic per-example rule and
+      the reference implementation. 'fused' runs the same rule for all
+      epochs in a single compiled kernel (numba, if installed), giving
+      the same weights up to floating point rounding. 'minibatch'
+      updates the weights once per batch of `batch_size` examples,
+      using the predictions of the weights at the start of the batch.
+    batch_size : int
+      Number of examples per weight update of the 'minibatch' solver.
+    dtype : data-type
+      Floating point type of the weights, which training vectors are
+      converted to as well. np.float32 halves the memory and memory
+      bandwidth of training, at the cost of precision.
+    reuse_buffers : bool
+      Preallocate the net input and update buffers of the 'minibatch'
+      solver once and update them in place, instead of allocating
+      new temporaries for every batch. Ignored for sparse input, and
+      by the 'online' and 'fused' solvers, which do not allocate
+      per example.
+    tol : float or None
+      Stop once the number of misclassifications has not dropped by
+      more than `tol` below its best value for `patience` epochs in a
+      row (None to disable).
+    patience : int
+      Number of epochs without improvement tolerated by `tol`.
+    stop_on_zero_errors : bool
+      Stop after the first epoch without misclassifications, since the
+      weights can no longer change.
+    callback : callable or None
+      Called as `callback(model, info)` after every epoch, with `info`
+      a dict of the 'epoch' number, its wall 'time' in seconds and its
+      number of 'errors'. Training stops if it returns True.
 
     Attributes
     -----------
@@ -20,19 +173,34 @@ class Perceptron(object):
       Weights after fitting.
     errors_ : list
       Number of misclassifications (updates) in each epoch.
+    epoch_times_ : list
+      Wall time in seconds of each epoch.
+    n_iter_ : int
+      Number of epochs actually run.
 
     """
-    def __init__(self, eta=0.01, n_iter=50, random_state=42):
+    def __init__(self, eta=0.01, n_iter=50, random_state=42,
+                 solver='online', batch_size=32, dtype=np.float64,
+                 reuse_buffers=False, tol=None, patience=1,
+                 stop_on_zero_errors=False, callback=None):
         self.eta = eta
         self.n_iter = n_iter
         self.random_state = random_state
+        self.solver = solver
+        self.batch_size = batch_size
+        self.dtype = dtype
+        self.reuse_buffers = reuse_buffers
+        self.tol = tol
+        self.patience = patience
+        self.stop_on_zero_errors = stop_on_zero_errors
+        self.callback = callback
 
     def fit(self, X, y):
         """Fit training data.
 
         Parameters
         ----------
-        X : {array-like}, shape = [n_examples, n_features]
+        X : {array-like, sparse matrix}, shape = [n_examples, n_features]
           Training vectors, where n_examples is the number of examples and
           n_features is the number of features.
         y : array-like, shape = [n_examples]
@@ -44,21 +212,139 @@ class Perceptron(object):
 
         """
         rgen = np.random.RandomState(self.random_state)
-        self.w_ = rgen.normal(loc=0.0, scale=0.01, size=1 + X.shape[1])
+        self.w_ = rgen.normal(loc=0.0, scale=0.01,
+                              size=1 + X.shape[1]).astype(self.dtype)
         self.errors_ = []
+        self.epoch_times_ = []
+        self.n_iter_ = 0
+        self._best_errors, self._n_no_change = np.inf, 0
+        y = np.asarray(y, dtype=self.dtype)
+
+        if _issparse(X):
+            X = _as_csr(X).astype(self.dtype, copy=False)
+            if self.solver in ('online', 'fused'):
+                return self._fit_sparse(X, y)
+        else:
+            X = np.asarray(X, dtype=self.dtype)
+
+        if self.solver == 'fused':
+            return self._fit_kernel(_fit_fused, np.ascontiguousarray(X),
+                                    np.ascontiguousarray(y))
+
+        if self.solver == 'minibatch':
+            return self._fit_minibatch(X, y)
 
-        for _ in range(self.n_iter):
+        if self.solver != 'online':
+            raise ValueError("solver must be 'online', 'fused' or "
+                             "'minibatch', got %r" % self.solver)
+
+        for epoch in range(self.n_iter):
+            started = time.perf_counter()
             errors = 0
             for xi, target in zip(X, y):
                 update = self.eta * (target - self.predict(xi))
                 self.w_[1:] += update * xi
                 self.w_[0] += update
                 errors += int(update != 0.0)
-            self.errors_.append(errors)
+            if self._end_epoch(epoch, started, errors):
+                break
+        return self
+
+    def _end_epoch(self, epoch, started, errors):
+        """Record an epoch, report it to `callback` and return whether
+        training should stop"""
+        elapsed = time.perf_counter() - started
+        self.errors_.append(errors)
+        self.epoch_times_.append(elapsed)
+        self.n_iter_ = epoch + 1
+
+        stop = self.stop_on_zero_errors and errors == 0
+        if self.tol is not None:
+            if errors > self._best_errors - self.tol:
+                self._n_no_change += 1
+            else:
+                self._n_no_change = 0
+            self._best_errors = min(self._best_errors, errors)
+            stop = stop or self._n_no_change >= self.patience
+
+        if self.callback is not None:
+            info = {'epoch': epoch, 'time': elapsed, 'errors': errors}
+            stop = bool(self.callback(self, info)) or stop
+        return stop
+
+    def _fit_kernel(self, kernel, *data):
+        """Run a per-example training kernel one epoch at a time, so that
+        training can stop between epochs"""
+        errors = np.zeros(1, dtype=np.int64)
+        for epoch in range(self.n_iter):
+            started = time.perf_counter()
+            kernel(*data, self.w_, float(self.eta), 1, errors)
+            if self._end_epoch(epoch, started, int(errors[0])):
+                break
+        return self
+
+    def _fit_sparse(self, X, y):
+        """Fit a CSR matrix with the per-example rule, compiled for 'fused'
+        and looping in Python for 'online'"""
+        fit = (_fit_fused_sparse if self.solver == 'fused'
+               else _fit_online_sparse_numpy)
+        return self._fit_kernel(fit, X.indptr, X.indices, X.data,
+                                np.ascontiguousarray(y))
+
+    def _fit_minibatch(self, X, y):
+        """Fit with one vectorized update per batch of examples"""
+        if self.reuse_buffers and not _issparse(X):
+            return self._fit_minibatch_inplace(X, y)
+
+        for epoch in range(self.n_iter):
+            started = time.perf_counter()
+            errors = 0
+            for start in range(0, X.shape[0], self.batch_size):
+                xb = X[start:start + self.batch_size]
+                update = self.eta * (y[start:start + self.batch_size]
+                                     - self.predict(xb))
+                if _issparse(xb):
+                    _add_sparse_dot(self.w_[1:], xb, update)
+                else:
+                    self.w_[1:] += xb.T.dot(update)
+                self.w_[0] += update.sum()
+                errors += int(np.count_nonzero(update))
+            if self._end_epoch(epoch, started, errors):
+                break
+        return self
+
+    def _fit_minibatch_inplace(self, X, y):
+        """`_fit_minibatch` computing every batch in preallocated buffers"""
+        X = np.ascontiguousarray(X)
+        update_buf = np.empty(self.batch_size, dtype=self.dtype)
+        grad = np.empty(X.shape[1], dtype=self.dtype)
+
+        for epoch in range(self.n_iter):
+            started = time.perf_counter()
+            errors = 0
+            for start in range(0, X.shape[0], self.batch_size):
+                xb = X[start:start + self.batch_size]
+                update = update_buf[:xb.shape[0]]
+                # update = eta * (y - predict(xb)), predictions being +-1
+                np.dot(xb, self.w_[1:], out=update)
+                update += self.w_[0]
+                np.greater_equal(update, 0.0, out=update)
+                update *= -2.0
+                update += 1.0
+                update += y[start:start + self.batch_size]
+                update *= self.eta
+                np.dot(update, xb, out=grad)
+                self.w_[1:] += grad
+                self.w_[0] += update.sum()
+                errors += int(np.count_nonzero(update))
+            if self._end_epoch(epoch, started, errors):
+                break
         return self
 
     def net_input(self, X):
         """Calculate net input"""
+        if _issparse(X):
+            return X.dot(self.w_[1:]) + self.w_[0]
         return np.dot(X, self.w_[1:]) + self.w_[0]
 
     def predict(self, X):
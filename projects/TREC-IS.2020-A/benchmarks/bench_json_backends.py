@@ -0,0 +1,82 @@
+"""Compare JSON decoding backends of the corpus reader on a synthetic
+corpus of Tweets with realistically large nested payloads.
+
+    python benchmarks/bench_json_backends.py --n-tweets 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'processing'))
+
+from corpus_readers import iter_span  # noqa: E402
+from json_backends import available_backends  # noqa: E402
+
+ATTRIBS = ['full_text', 'target', 'labels']
+
+
+def make_user(rgen, i):
+    return {
+        'id': i, 'id_str': str(i), 'screen_name': f'user{i}',
+        'name': f'User {i}', 'description': 'lorem ipsum ' * 10,
+        'followers_count': rgen.randint(0, 10 ** 6),
+        'friends_count': rgen.randint(0, 10 ** 4),
+        'profile_image_url_https': f'https://pbs.twimg.com/{i}.jpg',
+        'entities': {'url': {'urls': []}, 'description': {'urls': []}},
+    }
+
+
+def make_tweet(rgen, i):
+    tweet = {
+        'id': i, 'id_str': str(i),
+        'full_text': ' '.join(rgen.choice(['flood', 'fire', 'help', 'road',
+                                           'closed', 'rescue', '#storm'])
+                              for _ in range(25)),
+        'target': rgen.randint(0, 1),
+        'labels': rgen.sample(['Advice', 'Weather', 'Location', 'News'], 2),
+        'user': make_user(rgen, rgen.randint(0, 10 ** 6)),
+        'entities': {
+            'hashtags': [{'text': 'storm', 'indices': [0, 6]}] * 3,
+            'user_mentions': [{'screen_name': 'someone', 'id': 1,
+                               'indices': [7, 15]}] * 2,
+            'urls': [{'url': 'https://t.co/x', 'indices': [16, 30]}],
+        },
+    }
+    if rgen.random() < 0.5:
+        tweet['retweeted_status'] = dict(tweet, user=make_user(rgen, i + 1))
+    return tweet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--n-tweets', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rgen = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'tweets.jsonl')
+        with open(path, 'w', encoding='utf8') as fp:
+            for i in range(args.n_tweets):
+                fp.write(json.dumps(make_tweet(rgen, i)) + '\n')
+        size = os.path.getsize(path)
+        print(f'{args.n_tweets} tweets, {size / 2 ** 20:.1f} MiB')
+
+        for backend in available_backends():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for _ in iter_span(path, 0, size, ATTRIBS, backend=backend):
+                    pass
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(f'{backend:>10}: {best:.3f}s '
+                  f'({args.n_tweets / best:,.0f} tweets/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import os
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Tweets per record batch of the cache files
+BATCH_SIZE = 10000
+
+
+class ArrowCorpusCache():
+    """On-disk columnar cache of parsed Tweet attributes, one Arrow IPC
+    file per corpus fileid. Cached files are memory-mapped on read, so
+    repeated passes over the corpus skip JSON decoding entirely.
+
+    A cached file is only considered valid if the size and modification
+    time of its source file are the same as when the cache was written,
+    and if it holds all of the ``columns``.
+    """
+
+    SUFFIX = '.arrow'
+
+    def __init__(self, cache_dir, columns, batch_size=BATCH_SIZE):
+        if pa is None:
+            raise ImportError('pyarrow is required for the corpus cache')
+
+        self.cache_dir = cache_dir
+        self.columns = list(columns)
+        self.batch_size = batch_size
+
+    def path(self, fileid):
+        return os.path.join(self.cache_dir, fileid + self.SUFFIX)
+
+    def covers(self, attribs):
+        """Check if all requested attributes are held in the cache"""
+        return all(attrib in self.columns for attrib in attribs)
+
+    def is_valid(self, fileid, source_path):
+        path = self.path(fileid)
+        if not os.path.exists(path):
+            return False
+
+        with pa.memory_map(path) as source:
+            schema = pa.ipc.open_file(source).schema
+        metadata = schema.metadata or {}
+
+        # Files written for fewer columns are stale too, e.g. after the
+        # reader was opened on the same cache_dir with more attribs
+        return (metadata.get(b'source_stamp') == self._stamp(source_path)
+                and set(self.columns) <= set(schema.names))
+
+    def write(self, fileid, source_path, records):
+        """Write an iterable of Tweet attribute tuples (ordered as
+        ``columns``) to the cache, tagged with the source file stamp, in
+        record batches of ``batch_size`` Tweets so that neither writing
+        nor reading holds more than one batch in memory.
+        """
+        path = self.path(fileid)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Column types are only known once all batches are seen (e.g. a
+        # column can be null throughout the first ones), so batches are
+        # spilled to disk as they are parsed, then cast to the unified
+        # schema. Write to a temporary file first so that readers never
+        # see a partially written cache file.
+        spill_path = path + '.spill'
+        tmp_path = path + '.tmp'
+        try:
+            offsets, schemas = self._spill(spill_path, records)
+            schema = pa.unify_schemas(schemas, promote_options='permissive')
+            schema = schema.with_metadata(
+                {'source_stamp': self._stamp(source_path)})
+
+            with pa.memory_map(spill_path) as spill, \
+                    pa.OSFile(tmp_path, 'wb') as sink, \
+                    pa.ipc.new_file(sink, schema) as writer:
+                buffer = spill.read_buffer()
+                for start, end in zip(offsets, offsets[1:]):
+                    batch = pa.ipc.open_stream(
+                        buffer.slice(start, end - start)).read_next_batch()
+                    writer.write_batch(batch.cast(schema))
+        finally:
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+        os.replace(tmp_path, path)
+
+    def _spill(self, spill_path, records):
+        """Writes ``records`` in batches to a file of consecutive Arrow IPC
+        streams, one per batch, and returns the byte offsets delimiting
+        them and the schema of every batch."""
+        offsets, schemas = [0], []
+        with pa.OSFile(spill_path, 'wb') as sink:
+            for batch in self._batches(records):
+                with pa.ipc.new_stream(sink, batch.schema) as writer:
+                    writer.write_batch(batch)
+                offsets.append(sink.tell())
+                schemas.append(batch.schema)
+
+        if not schemas:
+            schemas.append(pa.schema(
+                [pa.field(name, pa.null()) for name in self.columns]))
+        return offsets, schemas
+
+    def _batches(self, records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.batch_size:
+                yield self._record_batch(batch)
+                batch = []
+        if batch:
+            yield self._record_batch(batch)
+
+    def _record_batch(self, records):
+        columns = list(zip(*records))
+        return pa.RecordBatch.from_arrays(
+            [pa.array(col) for col in columns], names=self.columns)
+
+    def read(self, fileid, attribs):
+        """Yield attribute tuples (ordered as ``attribs``) from the
+        memory-mapped cache file, one record batch at a time.
+        """
+        with pa.memory_map(self.path(fileid)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                columns = [batch.column(attrib).to_pylist()
+                           for attrib in attribs]
+                yield from zip(*columns)
+
+    @staticmethod
+    def _stamp(source_path):
+        stat = os.stat(source_path)
+        return f'{stat.st_size}:{stat.st_mtime_ns}'.encode()
@@ -2,10 +2,147 @@ from nltk.corpus.reader.api import CategorizedCorpusReader
 from nltk.corpus.reader.twitter import TwitterCorpusReader
 
 import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from corpus_cache import ArrowCorpusCache
+from json_backends import get_backend
+from line_index import LineIndex
 
 CAT_PATTERN = r'(\w+)/.*'
 DOC_PATTERN = r'.*.jsonl'
 ATTRIBS = ['full_text']
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def extract_attrib(jsono, attrib, encoding='utf8'):
+    """
+    Returns a single attribute value of a Tweet, normalized the same
+    way as the ``strings``, ``target`` and ``labels`` reader methods do.
+    """
+    
+    try:
+        value = jsono[attrib]
+    except KeyError:
+        return '' if attrib == 'full_text' else None
+
+    if attrib == 'full_text' and isinstance(value, bytes):
+        value = value.decode(encoding)
+    elif attrib == 'target' and not isinstance(value, int):
+        value = int(value)
+    elif attrib == 'labels' and not isinstance(value, list):
+        value = list(value)
+
+    return value
+
+
+def get_path(jsono, path):
+    """
+    Returns a nested attribute value of a Tweet, or ``None`` if any key
+    along the path is missing or null.
+    """
+    
+    for key in path:
+        try:
+            jsono = jsono[key]
+        except (KeyError, TypeError):
+            return None
+        if jsono is None:
+            return None
+    return jsono
+
+
+def extract_location(jsono):
+    """
+    Returns the id of a Tweet, its exact ``coordinates`` point as a
+    ``(lon, lat)`` pair and the vertices of its ``place`` bounding box 
+    polygon as a list of ``(lon, lat)`` pairs, each ``None`` if missing.
+    """
+    
+    point = get_path(jsono, ('coordinates', 'coordinates'))
+    ring = get_path(jsono, ('place', 'bounding_box', 'coordinates'))
+    id_str = get_path(jsono, ('id_str',))
+    
+    return (None if id_str is None else str(id_str),
+            None if point is None else (float(point[0]), float(point[1])),
+            None if not ring else [(float(lon), float(lat)) 
+                                   for lon, lat in ring[0]])
+
+
+def ordered_map(executor, func, args, window):
+    """
+    Like ``Executor.map`` over tuples of arguments, but with at most 
+    ``window`` calls in flight, so that arguments are consumed and results
+    kept in memory only as fast as the results are. Calls not started yet
+    are cancelled if the generator is closed early.
+    """
+    
+    pending = deque()
+    try:
+        for call_args in args:
+            pending.append(executor.submit(func, *call_args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_span(path, start, end, attribs, encoding='utf8', backend='auto'):
+    """
+    Parses the Tweets of a line-delimited JSON file whose lines start
+    within the ``[start, end)`` byte range, yielding a tuple of the 
+    requested attribute values for each. Only the requested attributes 
+    are materialized if the JSON ``backend`` is a lazy one.
+    """
+    
+    backend = get_backend(backend)
+    
+    for line in iter_span_lines(path, start, end):
+        # Lazy documents must not outlive the extraction of attributes,
+        # since they are invalidated by the next call to ``loads``
+        yield _extract_record(backend, backend.loads(line), attribs, 
+                              encoding)
+
+
+def iter_span_lines(path, start, end):
+    """
+    Yields the non-blank lines of a file that start within the 
+    ``[start, end)`` byte range, as bytes, so that adjacent ranges 
+    split the lines of a file between them without overlap.
+    """
+    
+    with open(path, 'rb') as fp:
+        # Skip ahead to the first line starting at or after ``start``
+        if start > 0:
+            fp.seek(start - 1)
+            fp.readline()
+
+        while fp.tell() < end:
+            line = fp.readline()
+            if not line:
+                break
+            if line.strip():
+                yield line
+
+
+def _extract_record(backend, jsono, attribs, encoding):
+    return tuple(backend.materialize(extract_attrib(jsono, attrib, encoding))
+                 for attrib in attribs)
+
+
+def read_span(path, start, end, attribs, encoding='utf8', backend='auto'):
+    """
+    Returns the parsed records of a byte range as a list. Runs in worker 
+    processes, so that a single huge file can be split across several.
+    """
+    
+    return list(iter_span(path, start, end, attribs, encoding, backend))
 
 
 class TweepyRawCorpusReader(CategorizedCorpusReader, TwitterCorpusReader):
@@ -20,7 +157,9 @@ class TweepyRawCorpusReader(CategorizedCorpusReader, TwitterCorpusReader):
 
     
     def __init__(self, root, fileids=DOC_PATTERN, encoding='utf8', 
-                 attribs=ATTRIBS, single_cat='Advice', **kwargs):
+                 attribs=ATTRIBS, single_cat='Advice', cache_dir=None, 
+                 n_jobs=1, chunk_bytes=CHUNK_BYTES, json_backend='auto', 
+                 **kwargs):
         """
         Initialize the corpus reader.  Categorization arguments
         (``cat_pattern``, ``cat_map``, and ``cat_file``) are passed to
@@ -30,6 +169,18 @@ class TweepyRawCorpusReader(CategorizedCorpusReader, TwitterCorpusReader):
         ``single_cat`` is the singled-out category from which we draw
         Tweets since they are duplicated across categories with only
         ``target`` attribute values as different.
+
+        ``cache_dir`` opts into an on-disk columnar cache of the parsed
+        ``attribs`` (plus ``target`` and ``labels``) used by ``records``
+        and ``batches``, which requires ``pyarrow``.
+
+        ``n_jobs`` sets the number of worker processes ``records`` and
+        ``batches`` parse the corpus with (-1 to use all cores). Files
+        are split into byte ranges of at most ``chunk_bytes`` each.
+
+        ``json_backend`` selects the JSON decoder of ``records`` and
+        ``batches``: ``'simdjson'``, ``'orjson'``, ``'json'`` or ``'auto'``
+        for the fastest one installed.
         """
         
         # Add the default category pattern if not passed into the class.
@@ -46,6 +197,22 @@ class TweepyRawCorpusReader(CategorizedCorpusReader, TwitterCorpusReader):
         # Store fileids of a singled-out category since Tweets are duplicated 
         # across categories (with only ``target`` attribute values as different)
         # self.single_cat = self.fileids(categories='Advice')
+
+        # Optionally cache parsed attributes in a columnar format
+        self.cache = None
+        if cache_dir is not None:
+            columns = dict.fromkeys(list(attribs) + ['target', 'labels'])
+            self.cache = ArrowCorpusCache(cache_dir, columns)
+
+        # Parallel parsing options
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.chunk_bytes = chunk_bytes
+
+        # Fail early if the requested JSON backend is not installed
+        self.json_backend = get_backend(json_backend).name
+
+        # Sidecar line indexes, loaded on first random access to a fileid
+        self._line_indexes = {}
       
     
     def strings(self, fileids=None, categories=None):
@@ -149,6 +316,242 @@ class TweepyRawCorpusReader(CategorizedCorpusReader, TwitterCorpusReader):
         return quoted_status_indicators
 
     
+    def records(self, fileids=None, categories=None, attribs=None):
+        """
+        Streams Tweets in the file(s) in a single pass, yielding a tuple
+        of the requested attribute values for each Tweet. Unlike calling
+        ``strings``, ``target`` and ``labels`` one after another, every
+        JSON line is parsed only once and nothing is accumulated in memory.
+        If the reader has a cache, files are parsed only on the first read.
+        If the reader has ``n_jobs`` other than 1, files are parsed in 
+        parallel, and records are yielded in the same order regardless.
+
+        ``attribs`` defaults to the attributes the reader was initialized
+        with. Missing attributes are yielded as ``None`` (or an empty
+        string for ``full_text``) so that the values stay aligned.
+
+        :return: a generator of Tweet attribute tuples, ordered as ``attribs``.
+        :rtype: iter(tuple)
+        """
+        attribs = attribs or self.attribs
+        fileids = self.resolve(fileids, categories)
+
+        if self.cache is None or not self.cache.covers(attribs):
+            if self.n_jobs == 1:
+                for span in self.spans(fileids):
+                    yield from self._iter_span(span, attribs)
+            else:
+                yield from self._parallel_records(fileids, attribs)
+            return
+
+        for fileid in self._fileid_list(fileids):
+            source_path = self.abspath(fileid)
+            if not self.cache.is_valid(fileid, source_path):
+                self.cache.write(fileid, source_path, (
+                    record for span in self.spans(fileid)
+                    for record in self._iter_span(span, self.cache.columns)
+                ))
+            yield from self.cache.read(fileid, attribs)
+
+
+    def batches(self, fileids=None, categories=None, attribs=None, 
+                batch_size=1000):
+        """
+        Groups the output of ``records`` into fixed-size batches, so that
+        feature extraction can be done on bounded chunks of the corpus.
+        The last batch may be smaller than ``batch_size``.
+
+        :return: a generator of tuples of aligned lists, one list per 
+                 attribute in ``attribs``.
+        :rtype: iter(tuple(list))
+        """
+        attribs = attribs or self.attribs
+        batch = []
+
+        for record in self.records(fileids, categories, attribs):
+            batch.append(record)
+            if len(batch) == batch_size:
+                yield tuple(map(list, zip(*batch)))
+                batch = []
+
+        if batch:
+            yield tuple(map(list, zip(*batch)))
+
+
+    def line_index(self, fileid):
+        """
+        Returns the ``LineIndex`` of a fileid, loading its sidecar index 
+        file next to the corpus file, or building it on first use.
+        """
+        
+        index = self._line_indexes.get(fileid)
+        if index is None:
+            index = LineIndex.load(self.abspath(fileid), self.json_backend)
+            self._line_indexes[fileid] = index
+        
+        return index
+
+
+    def docs_by_ids(self, ids, fileids=None, categories=None):
+        """
+        Returns the full Tweet objects with the given ids, read by seeking 
+        to their offsets in the sidecar indexes of the file(s). Tweets are 
+        returned in the order of ``ids``, missing ones are skipped, and 
+        only the first file containing a Tweet is read from.
+
+        :rtype: list(dict)
+        """
+        
+        fileids = self._fileid_list(self.resolve(fileids, categories))
+        ids = [int(id_) for id_ in ids]
+        found = {}
+
+        for fileid in fileids:
+            if len(found) == len(ids):
+                break
+            
+            index = self.line_index(fileid)
+            wanted = [id_ for id_ in ids if id_ not in found]
+            rows = index.rows(wanted)
+            hits = [(id_, row) for id_, row in zip(wanted, rows) if row >= 0]
+            if hits:
+                docs = index.read([row for _, row in hits], self.json_backend)
+                found.update(zip((id_ for id_, _ in hits), docs))
+
+        return [found[id_] for id_ in ids if id_ in found]
+
+
+    def docs_slice(self, start, stop, fileids=None, categories=None):
+        """
+        Returns the full Tweet objects of lines ``start`` to ``stop`` of 
+        the concatenated file(s), the same as ``docs()[start:stop]`` but
+        without reading anything outside of the slice.
+
+        :rtype: list(dict)
+        """
+        
+        fileids = self._fileid_list(self.resolve(fileids, categories))
+        docs = []
+        offset = 0
+
+        for fileid in fileids:
+            index = self.line_index(fileid)
+            lo, hi = max(start - offset, 0), min(stop - offset, len(index))
+            if lo < hi:
+                docs += index.read(range(lo, hi), self.json_backend)
+            
+            offset += len(index)
+            if offset >= stop:
+                break
+
+        return docs
+
+
+    def locations(self, fileids=None, categories=None):
+        """
+        Extracts the location of every Tweet in the file(s) in a single
+        pass, as a dict of arrays aligned with ``docs``: ``ids``, ``lon`` 
+        and ``lat`` in degrees, and ``source``, which is 1 for an exact
+        ``coordinates`` point, 2 for the centroid of the ``place``
+        bounding box of Tweets without one and 0 (with NaN ``lon`` and
+        ``lat``) for Tweets without either. Centroids are computed for
+        all bounding boxes at once, as the mean of their vertices.
+
+        :rtype: dict(str, numpy.ndarray)
+        """
+        
+        backend = get_backend(self.json_backend)
+        ids = []
+        points = array('d')
+        # Bounding box vertices of Tweets with a place, flattened
+        ring_rows, ring_sizes = array('q'), array('q')
+        ring_vertices = array('d')
+
+        for path, start, end, _ in self.spans(fileids, categories):
+            for line in iter_span_lines(path, start, end):
+                id_str, point, ring = extract_location(backend.loads(line))
+                if ring:
+                    ring_rows.append(len(ids))
+                    ring_sizes.append(len(ring))
+                    for vertex in ring:
+                        ring_vertices.extend(vertex)
+                ids.append(id_str)
+                points.extend(point or (np.nan, np.nan))
+
+        points = np.frombuffer(points, dtype=np.float64).reshape(-1, 2)
+        lon, lat = points[:, 0].copy(), points[:, 1].copy()
+        source = np.where(np.isnan(lon), 0, 1).astype(np.int8)
+
+        if ring_rows:
+            sizes = np.frombuffer(ring_sizes, dtype=np.int64)
+            vertices = np.frombuffer(ring_vertices, 
+                                     dtype=np.float64).reshape(-1, 2)
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+            centroids = np.add.reduceat(vertices, starts) / sizes[:, None]
+
+            rows = np.frombuffer(ring_rows, dtype=np.int64)
+            missing = source[rows] == 0
+            lon[rows[missing]] = centroids[missing, 0]
+            lat[rows[missing]] = centroids[missing, 1]
+            source[rows[missing]] = 2
+
+        return {'ids': np.array(ids, dtype=np.str_), 'lon': lon, 'lat': lat,
+                'source': source}
+
+
+    def spans(self, fileids=None, categories=None):
+        """
+        Returns a list of ``(path, start, end, encoding)`` byte ranges 
+        covering the file(s), in fileid order, with none larger than 
+        ``chunk_bytes``.
+        """
+        
+        fileids = self.resolve(fileids, categories)
+
+        spans = []
+        for path, encoding in self.abspaths(fileids, include_encoding=True):
+            size = os.path.getsize(path)
+            for start in range(0, size, self.chunk_bytes):
+                end = min(start + self.chunk_bytes, size)
+                spans.append((path, start, end, encoding))
+        
+        return spans
+
+
+    def _parallel_records(self, fileids, attribs):
+        """
+        Farms the parsing of byte ranges of the file(s) out to a process
+        pool. ``ordered_map`` keeps the results in submission order.
+        """
+        
+        spans = self.spans(fileids)
+        if not spans:
+            return
+
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+            # Only a few spans per worker are in flight, so that parsed
+            # spans don't pile up when the consumer is slower than the pool
+            window = 2 * (self.n_jobs or os.cpu_count())
+            results = ordered_map(executor, read_span, (
+                (path, start, end, attribs, encoding, self.json_backend)
+                for path, start, end, encoding in spans), window)
+            for records in results:
+                yield from records
+
+
+    def _fileid_list(self, fileids):
+        if fileids is None:
+            return self.fileids()
+        if isinstance(fileids, str):
+            return [fileids]
+        return fileids
+
+
+    def _iter_span(self, span, attribs):
+        path, start, end, encoding = span
+        return iter_span(path, start, end, attribs, encoding, self.json_backend)
+
+    
     def resolve(self, fileids=None, categories=None):
         """
         Returns a list of fileids or categories depending on what is passed
@@ -0,0 +1,228 @@
+import hashlib
+import re
+
+import numpy as np
+
+from corpus_readers import get_path, iter_span_lines
+from json_backends import get_backend
+
+RETWEET_PREFIX = re.compile(r'^RT @\w+:\s*')
+URL = re.compile(r'https?://\S+')
+WHITESPACE = re.compile(r'\s+')
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text):
+    """Returns the text of a Tweet without its 'RT @handle:' prefix and
+    URLs (which differ between copies of the same alert), lowercased and
+    with whitespace collapsed."""
+    text = RETWEET_PREFIX.sub('', text)
+    text = URL.sub(' ', text)
+    return WHITESPACE.sub(' ', text).strip().lower()
+
+
+class MinHasher():
+    """MinHash signatures of the character ``shingle_size``-grams of texts,
+    computed for a whole batch of texts with a few array operations.
+    """
+
+    def __init__(self, num_perm=64, shingle_size=5, random_state=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+        rgen = np.random.RandomState(random_state)
+        self.a = rgen.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self.b = rgen.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+        self.powers = np.uint64(1000003) ** np.arange(shingle_size,
+                                                      dtype=np.uint64)
+
+    def shingles(self, text):
+        """Returns the hashes of the character shingles of a text"""
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        if len(codes) < self.shingle_size:
+            codes = np.pad(codes, (0, self.shingle_size - len(codes)))
+        windows = np.lib.stride_tricks.sliding_window_view(
+            codes.astype(np.uint64), self.shingle_size)
+        hashes = (windows * self.powers).sum(axis=1)
+        return hashes % np.uint64(MERSENNE_PRIME)
+
+    def signatures(self, texts):
+        """Returns the (n_texts, num_perm) MinHash signatures of texts"""
+        shingles = [self.shingles(text) for text in texts]
+        if not shingles:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+
+        starts = np.cumsum([0] + [len(s) for s in shingles[:-1]])
+        hashes = np.concatenate(shingles)
+        # Universal hashing, keeping the high bits of the wrapped product
+        permuted = self.a[:, None] * hashes + self.b[:, None]
+        permuted >>= np.uint64(32)
+        minima = np.minimum.reduceat(permuted, starts, axis=1)
+        return minima.T.astype(np.uint32)
+
+
+class NearDuplicateClusterer():
+    """Streaming clustering of Tweets into groups of retweets, exact copies
+    and near-duplicates.
+
+    Every Tweet first goes to the cluster whose representative (first
+    member) has its source status (the retweeted status for retweets,
+    itself otherwise) or its exact normalized text. Failing that, MinHash
+    signatures are matched with locality-sensitive hashing over ``bands``
+    bands to the first cluster whose representative has an estimated
+    Jaccard similarity of at least ``threshold``, else the Tweet starts a
+    new cluster. Only representatives are indexed, by both exact keys and
+    signature bands, so memory grows with the number of clusters rather
+    than of Tweets.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=5,
+                 random_state=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm, shingle_size, random_state)
+
+        self._exact = {}    # source status or text digest -> cluster
+        self._buckets = {}  # (band, band signature) -> cluster
+        self._signatures = []
+        self.representatives = []  # number of the first Tweet of clusters
+        self.representative_texts = []
+        self.n_seen = 0
+
+    def add_batch(self, texts, sources=None):
+        """Clusters a batch of Tweets, given their texts and source status
+        ids, and returns their cluster ids."""
+        sources = sources or [None] * len(texts)
+        normalized = [normalize_text(text) for text in texts]
+        digests = [hashlib.blake2b(text.encode('utf8'),
+                                   digest_size=16).digest()
+                   for text in normalized]
+        clusters = np.empty(len(texts), dtype=np.int64)
+
+        # Signatures are only computed for Tweets without an exact match
+        pending = [i for i in range(len(texts))
+                   if ('status', sources[i]) not in self._exact
+                   and ('text', digests[i]) not in self._exact]
+        signatures = dict(zip(pending, self.hasher.signatures(
+            [normalized[i] for i in pending])))
+
+        for i, text in enumerate(texts):
+            keys = [('text', digests[i])]
+            if sources[i] is not None:
+                keys.insert(0, ('status', sources[i]))
+
+            cluster = next((self._exact[key] for key in keys
+                            if key in self._exact), None)
+            if cluster is None:
+                cluster = self._match(signatures[i])
+            if cluster is None:
+                cluster = self._new_cluster(signatures[i], text)
+                for key in keys:
+                    self._exact.setdefault(key, cluster)
+            clusters[i] = cluster
+            self.n_seen += 1
+
+        return clusters
+
+    def _bands(self, signature):
+        rows = self.hasher.num_perm // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes())
+                for band in range(self.bands)]
+
+    def _match(self, signature):
+        for key in self._bands(signature):
+            cluster = self._buckets.get(key)
+            if cluster is not None and np.mean(
+                    self._signatures[cluster] == signature) >= self.threshold:
+                return cluster
+        return None
+
+    def _new_cluster(self, signature, text):
+        cluster = len(self.representatives)
+        self.representatives.append(self.n_seen)
+        self.representative_texts.append(text)
+        self._signatures.append(signature)
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, cluster)
+        return cluster
+
+
+class TweetClusters():
+    """Cluster ids of the Tweets of a corpus, aligned with ``docs``, and
+    the Tweet number and text of the representative of every cluster, so
+    that downstream steps can process representatives only and broadcast
+    their results back with ``expand``.
+    """
+
+    def __init__(self, ids, clusters, representatives, representative_texts):
+        self.ids = np.asarray(ids, dtype=np.str_)
+        self.clusters = np.asarray(clusters, dtype=np.int64)
+        self.representatives = np.asarray(representatives, dtype=np.int64)
+        self.representative_texts = list(representative_texts)
+
+    def __len__(self):
+        return len(self.clusters)
+
+    @property
+    def n_clusters(self):
+        return len(self.representatives)
+
+    def sizes(self):
+        """Returns the number of Tweets in every cluster"""
+        return np.bincount(self.clusters, minlength=self.n_clusters)
+
+    def expand(self, values):
+        """Broadcasts per-cluster values, such as the predictions for the
+        representative texts, to every Tweet"""
+        return np.asarray(values)[self.clusters]
+
+
+def _extract_text(jsono):
+    """Returns the id, source status id and text of a Tweet as plain
+    strings, so that lazy documents can be released."""
+    id_str = get_path(jsono, ('id_str',))
+    source = get_path(jsono, ('retweeted_status', 'id_str')) or id_str
+    # Retweets carry the full text of the original
+    text = (get_path(jsono, ('retweeted_status', 'full_text'))
+            or get_path(jsono, ('full_text',)) or '')
+    return (None if id_str is None else str(id_str),
+            None if source is None else str(source), str(text))
+
+
+def cluster_tweets(reader, fileids=None, categories=None, batch_size=1000,
+                   **kwargs):
+    """Clusters the Tweets of a ``TweepyRawCorpusReader`` in a single
+    streaming pass, in batches of ``batch_size``, with a
+    ``NearDuplicateClusterer`` built from ``kwargs``. Copies of a Tweet
+    in several category files share their cluster.
+
+    :rtype: TweetClusters
+    """
+    backend = get_backend(reader.json_backend)
+    clusterer = NearDuplicateClusterer(**kwargs)
+    ids, cluster_batches = [], []
+    texts, sources = [], []
+
+    def flush():
+        cluster_batches.append(clusterer.add_batch(texts, sources))
+        texts.clear()
+        sources.clear()
+
+    for path, start, end, _ in reader.spans(fileids, categories):
+        for line in iter_span_lines(path, start, end):
+            id_str, source, text = _extract_text(backend.loads(line))
+            ids.append(id_str)
+            sources.append(source)
+            texts.append(text)
+            if len(texts) == batch_size:
+                flush()
+    if texts:
+        flush()
+
+    return TweetClusters(
+        ids, np.concatenate(cluster_batches) if cluster_batches
+        else np.zeros(0, dtype=np.int64),
+        clusterer.representatives, clusterer.representative_texts)
@@ -0,0 +1,250 @@
+import glob
+import os
+import re
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from corpus_readers import ordered_map
+
+try:
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+except ImportError:
+    try:
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    except ImportError:
+        SentimentIntensityAnalyzer = None
+
+SHARD_PATTERN = 'part-*.npz'
+
+
+class TextStats():
+    """Surface features of Tweet texts. A feature is a picklable callable
+    scoring a batch of texts as an (n_texts, n_columns) array, with a
+    ``name`` and a ``version`` to bump whenever its output changes, which
+    key its values in a ``FeatureStore``.
+    """
+
+    name = 'text_stats'
+    version = 1
+    columns = ['n_chars', 'n_words', 'n_hashtags', 'n_mentions', 'n_urls',
+               'uppercase_ratio', 'is_retweet']
+
+    HASHTAG = re.compile(r'#\w+')
+    MENTION = re.compile(r'@\w+')
+    URL = re.compile(r'https?://\S+')
+
+    def __call__(self, texts):
+        values = np.array([
+            (len(text), len(text.split()), len(self.HASHTAG.findall(text)),
+             len(self.MENTION.findall(text)), len(self.URL.findall(text)),
+             sum(c.isupper() for c in text) / max(len(text), 1),
+             text.startswith('RT @'))
+            for text in texts], dtype=np.float32)
+        return values.reshape(-1, len(self.columns))
+
+
+class VaderSentiment():
+    """VADER sentiment scores of Tweet texts, with the ``vaderSentiment``
+    package or NLTK's port of it (which needs the ``vader_lexicon`` data).
+    The analyzer is created on first use in every worker process.
+    """
+
+    name = 'vader'
+    version = 1
+    columns = ['neg', 'neu', 'pos', 'compound']
+
+    def __init__(self):
+        if SentimentIntensityAnalyzer is None:
+            raise ImportError('VaderSentiment requires vaderSentiment or nltk')
+        self._analyzer = None
+
+    def __getstate__(self):
+        return {'_analyzer': None}
+
+    def __call__(self, texts):
+        if self._analyzer is None:
+            self._analyzer = SentimentIntensityAnalyzer()
+        scores = [self._analyzer.polarity_scores(text) for text in texts]
+        values = np.array([[score[column] for column in self.columns]
+                           for score in scores], dtype=np.float32)
+        return values.reshape(-1, len(self.columns))
+
+
+class FeatureStore():
+    """Persistent store of per-Tweet feature values keyed by ``id_str`` and
+    by the name and version of the feature. The values of every feature
+    version live in a directory of append-only ``.npz`` shards, written
+    as extraction runs go, so that runs only add the Tweets not scored yet.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self._loaded = {}  # feature directory -> (shards, ids, values)
+
+    def path(self, feature):
+        return os.path.join(self.store_dir, feature.name,
+                            f'v{feature.version}')
+
+    def _load(self, feature):
+        """Returns the ids (sorted) and values stored for a feature,
+        reading its shards again only if some were added."""
+        path = self.path(feature)
+        shards = sorted(glob.glob(os.path.join(path, SHARD_PATTERN)))
+        loaded = self._loaded.get(path)
+        if loaded is not None and loaded[0] == shards:
+            return loaded[1], loaded[2]
+
+        ids, values = [], []
+        for shard in shards:
+            with np.load(shard) as data:
+                ids.append(data['ids'])
+                values.append(data['values'])
+
+        n_columns = len(feature.columns)
+        ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        values = (np.concatenate(values) if values
+                  else np.zeros((0, n_columns), dtype=np.float32))
+        order = np.argsort(ids, kind='stable')
+        ids, values = ids[order], values[order]
+        self._loaded[path] = (shards, ids, values)
+        return ids, values
+
+    def __contains__(self, feature):
+        return bool(glob.glob(os.path.join(self.path(feature),
+                                           SHARD_PATTERN)))
+
+    def ids(self, feature):
+        """Returns the sorted ids of the Tweets stored for a feature"""
+        return self._load(feature)[0]
+
+    def _find(self, stored, ids):
+        """Returns the rows of ``ids`` in the sorted ``stored`` ids and a
+        mask of the ids found"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(stored):
+            return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), bool)
+        rows = np.searchsorted(stored, ids)
+        rows[rows == len(stored)] = 0
+        return rows, stored[rows] == ids
+
+    def missing(self, feature, ids):
+        """Returns a mask of the ``ids`` not stored for a feature yet"""
+        return ~self._find(self.ids(feature), ids)[1]
+
+    def append(self, feature, ids, values):
+        """Adds the values of new Tweets as a new shard"""
+        if not len(ids):
+            return
+        ids = np.asarray(ids, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        path = self.path(feature)
+        os.makedirs(path, exist_ok=True)
+        shards = sorted(glob.glob(os.path.join(path, SHARD_PATTERN)))
+        n_shards = len(shards)
+
+        # Write to a temporary file first so that readers never see a
+        # partially written shard
+        shard = os.path.join(path, f'part-{n_shards:05d}.npz')
+        tmp_path = shard + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, ids=ids, values=values)
+        os.replace(tmp_path, shard)
+
+        # Merge the new values into the loaded ones rather than reading
+        # every shard again
+        loaded = self._loaded.get(path)
+        if loaded is not None and loaded[0] == shards:
+            stored_ids = np.concatenate((loaded[1], ids))
+            stored_values = np.concatenate((loaded[2], values))
+            order = np.argsort(stored_ids, kind='stable')
+            self._loaded[path] = (sorted(shards + [shard]),
+                                  stored_ids[order], stored_values[order])
+
+    def get(self, feature, ids):
+        """Returns the (n_ids, n_columns) values of a feature for ``ids``,
+        NaN for Tweets not stored."""
+        stored, values = self._load(feature)
+        rows, found = self._find(stored, ids)
+        result = np.full((len(rows), len(feature.columns)), np.nan,
+                         dtype=np.float32)
+        result[found] = values[rows[found]]
+        return result
+
+
+def _new_batches(reader, feature, store, fileids, categories, batch_size,
+                 ids, queued, batch_ids):
+    """Yields ``(texts,)`` batches of the Tweets of the corpus not stored
+    for a feature yet, read one batch at a time. The ids of all Tweets are
+    appended to ``ids`` and those of every yielded batch to ``batch_ids``.
+    Tweets in ``queued`` (scored but not stored yet) are skipped, so that
+    Tweets duplicated across category files are only scored once.
+    """
+    new_ids, new_texts = [], []
+    for id_strs, texts in reader.batches(fileids, categories,
+                                         ['id_str', 'full_text'],
+                                         batch_size):
+        chunk_ids = np.array(id_strs, dtype=np.int64)
+        ids.frombytes(chunk_ids.tobytes())
+
+        for i in np.flatnonzero(store.missing(feature, chunk_ids)):
+            id_ = int(chunk_ids[i])
+            if id_ not in queued:
+                queued.add(id_)
+                new_ids.append(id_)
+                new_texts.append(texts[i])
+
+        # New Tweets are regrouped into full batches for the workers
+        if len(new_texts) >= batch_size:
+            batch_ids.append(new_ids[:batch_size])
+            yield (new_texts[:batch_size],)
+            new_ids, new_texts = new_ids[batch_size:], new_texts[batch_size:]
+
+    if new_texts:
+        batch_ids.append(new_ids)
+        yield (new_texts,)
+
+
+def extract_features(reader, feature, store, fileids=None, categories=None,
+                     batch_size=1000, n_jobs=1, shard_size=100000):
+    """Scores the Tweets of a ``TweepyRawCorpusReader`` with a feature,
+    incrementally: only Tweets without values in the ``store`` for the
+    feature's name and version are scored, in batches of ``batch_size``
+    texts farmed out to ``n_jobs`` processes (-1 for all cores), and
+    their values are appended to the store every ``shard_size`` Tweets.
+
+    The corpus is streamed with ``reader.batches``, so that only a few
+    batches of texts are held in memory at a time.
+
+    Returns the ids of the Tweets, in ``records`` order, and their
+    (n_tweets, n_columns) feature values.
+    """
+    ids = array('q')
+    queued = set()
+    batch_ids = deque()
+    batches = _new_batches(reader, feature, store, fileids, categories,
+                           batch_size, ids, queued, batch_ids)
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+
+    def store_results(results):
+        shard_ids, shard_values = [], []
+        for values in results:
+            shard_ids.extend(batch_ids.popleft())
+            shard_values.append(values)
+            if len(shard_ids) >= shard_size:
+                store.append(feature, shard_ids, np.concatenate(shard_values))
+                queued.difference_update(shard_ids)
+                shard_ids, shard_values = [], []
+        if shard_ids:
+            store.append(feature, shard_ids, np.concatenate(shard_values))
+
+    if n_jobs == 1:
+        store_results(feature(*args) for args in batches)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            store_results(ordered_map(executor, feature, batches, 2 * n_jobs))
+
+    ids = np.frombuffer(ids, dtype=np.int64)
+    return ids, store.get(feature, ids)
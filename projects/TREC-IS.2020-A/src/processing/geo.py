@@ -0,0 +1,85 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """Great-circle distance in km between points given in degrees,
+    broadcast over arrays."""
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2.0) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex():
+    """Spatial index of points on a regular grid of ``cell_deg`` degree
+    cells, such as the Tweet locations of ``TweepyRawCorpusReader.locations``.
+
+    Points are sorted by cell once, so that a radius query only computes
+    distances to the points of the cells overlapping the bounding box of
+    the circle, found by binary search, rather than to every Tweet.
+    Points with NaN coordinates are left out.
+    """
+
+    def __init__(self, lon, lat, cell_deg=0.1):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.n_lon_cells = int(np.ceil(360.0 / cell_deg))
+
+        located = np.flatnonzero(~(np.isnan(self.lon) | np.isnan(self.lat)))
+        cells = self._cells(self.lon[located], self.lat[located])
+        order = np.argsort(cells, kind='stable')
+        self._cells_sorted = cells[order]
+        self._points = located[order]
+
+    @classmethod
+    def from_locations(cls, locations, cell_deg=0.1):
+        return cls(locations['lon'], locations['lat'], cell_deg)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cells(self, lon, lat):
+        return (self._row(lat) * self.n_lon_cells
+                + self._column(lon) % self.n_lon_cells)
+
+    def _row(self, lat):
+        row = np.floor((np.asarray(lat) + 90.0) / self.cell_deg)
+        return row.astype(np.int64)
+
+    def _column(self, lon):
+        column = np.floor((np.asarray(lon) + 180.0) / self.cell_deg)
+        return column.astype(np.int64)
+
+    def within(self, lon, lat, radius_km):
+        """Returns the sorted indices of the points within ``radius_km`` of
+        the point ``(lon, lat)`` in degrees, e.g. of an incident."""
+        dlat = radius_km / KM_PER_DEGREE
+        cos_lat = np.cos(np.radians(min(abs(lat) + dlat, 90.0)))
+        dlon = 180.0 if cos_lat < 1e-9 else min(
+            radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+        # Cells of the bounding box of the circle, wrapping around the
+        # antimeridian
+        rows = np.arange(self._row(max(lat - dlat, -90.0)),
+                         self._row(min(lat + dlat, 90.0)) + 1)
+        columns = np.arange(self._column(lon - dlon),
+                            self._column(lon + dlon) + 1)
+        columns = np.unique(columns % self.n_lon_cells)
+        cells = (rows[:, None] * self.n_lon_cells + columns).ravel()
+
+        starts = np.searchsorted(self._cells_sorted, cells, side='left')
+        ends = np.searchsorted(self._cells_sorted, cells, side='right')
+        sizes = ends - starts
+        if not sizes.sum():
+            return np.zeros(0, dtype=np.int64)
+
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes,
+                                                     sizes)
+        candidates = self._points[np.repeat(starts, sizes) + offsets]
+        distances = haversine(lon, lat, self.lon[candidates],
+                              self.lat[candidates])
+        return np.sort(candidates[distances <= radius_km])
@@ -0,0 +1,93 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+class JSONBackend():
+    """Decoder of line-delimited JSON documents using the standard library.
+    Every document is fully materialized as Python objects.
+    """
+
+    name = 'json'
+    lazy = False
+
+    def loads(self, line):
+        return json.loads(line)
+
+    def materialize(self, value):
+        return value
+
+
+class OrjsonBackend(JSONBackend):
+    """Decoder using ``orjson``, which is several times faster than the
+    standard library but still materializes whole documents.
+    """
+
+    name = 'orjson'
+
+    def loads(self, line):
+        return orjson.loads(line)
+
+
+class SimdjsonBackend(JSONBackend):
+    """Lazy decoder using ``pysimdjson``. Documents are parsed into a
+    reusable buffer and only the fields that are accessed are converted
+    to Python objects, so nested payloads such as ``user``, ``entities``
+    or ``retweeted_status`` are never materialized unless asked for.
+
+    A parsed document is only valid until the next call to ``loads``.
+    """
+
+    name = 'simdjson'
+    lazy = True
+
+    def __init__(self):
+        self.parser = simdjson.Parser()
+
+    def loads(self, line):
+        return self.parser.parse(line)
+
+    def materialize(self, value):
+        if isinstance(value, simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, simdjson.Array):
+            return value.as_list()
+        return value
+
+
+BACKENDS = {
+    'simdjson': (SimdjsonBackend, simdjson),
+    'orjson': (OrjsonBackend, orjson),
+    'json': (JSONBackend, json),
+}
+
+
+def available_backends():
+    """Return the names of installed backends, fastest first"""
+    return [name for name, (_, module) in BACKENDS.items()
+            if module is not None]
+
+
+def get_backend(name='auto'):
+    """Return an instance of the named JSON backend, or of the fastest
+    installed one if ``name`` is ``'auto'``.
+    """
+    if name == 'auto':
+        name = available_backends()[0]
+
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown JSON backend: {name}')
+
+    backend_cls, module = BACKENDS[name]
+    if module is None:
+        raise ImportError(f'JSON backend {name} is not installed')
+
+    return backend_cls()
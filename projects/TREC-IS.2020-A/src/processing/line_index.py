@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+
+from json_backends import get_backend
+
+SUFFIX = '.idx.npz'
+
+
+class LineIndex():
+    """Sidecar index of a line-delimited JSON file of Tweets, mapping line
+    numbers and Tweet ids to the byte offsets of their lines, so that
+    records can be read by seeking instead of scanning the whole file.
+
+    The index is saved next to the indexed file and is rebuilt if the
+    size or modification time of the file changes.
+    """
+
+    def __init__(self, path, offsets, ids):
+        self.path = path
+        self.offsets = offsets
+        self.ids = ids
+
+        # Sorted copy of the ids for binary search lookups
+        self._order = np.argsort(ids, kind='stable')
+        self._sorted_ids = ids[self._order]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, path, backend='auto'):
+        """Scan the file once, recording the offset and id of every line"""
+        backend = get_backend(backend)
+        offsets, ids = [], []
+
+        with open(path, 'rb') as fp:
+            offset = 0
+            for line in fp:
+                if line.strip():
+                    offsets.append(offset)
+                    ids.append(int(backend.loads(line)['id_str']))
+                offset += len(line)
+
+        return cls(path, np.array(offsets, dtype=np.int64),
+                   np.array(ids, dtype=np.int64))
+
+    @classmethod
+    def load(cls, path, backend='auto'):
+        """Load the sidecar index of a file, building and saving it first
+        if it is missing or stale.
+        """
+        index_path = path + SUFFIX
+
+        if os.path.exists(index_path):
+            with np.load(index_path) as data:
+                if str(data['stamp']) == _stamp(path):
+                    return cls(path, data['offsets'], data['ids'])
+
+        index = cls.build(path, backend)
+        index.save()
+        return index
+
+    def save(self):
+        index_path = self.path + SUFFIX
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'wb') as fp:
+            np.savez(fp, offsets=self.offsets, ids=self.ids,
+                     stamp=np.array(_stamp(self.path)))
+        os.replace(tmp_path, index_path)
+
+    def rows(self, ids):
+        """Return the line numbers of Tweet ids, -1 for missing ones"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+
+        pos = np.searchsorted(self._sorted_ids, ids)
+        pos = np.minimum(pos, len(self._sorted_ids) - 1)
+
+        found = self._sorted_ids[pos] == ids
+        return np.where(found, self._order[pos], -1)
+
+    def read(self, rows, backend='auto'):
+        """Read the Tweets at the given line numbers, in the given order"""
+        backend = get_backend(backend)
+        docs = []
+
+        with open(self.path, 'rb') as fp:
+            for row in rows:
+                fp.seek(self.offsets[row])
+                docs.append(backend.materialize(backend.loads(fp.readline())))
+
+        return docs
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
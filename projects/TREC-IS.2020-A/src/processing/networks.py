@@ -0,0 +1,177 @@
+from array import array
+
+import numpy as np
+import scipy.sparse
+
+from corpus_readers import get_path, iter_span_lines
+from json_backends import get_backend
+
+EDGE_KINDS = ('reply', 'retweet', 'quote')
+
+# Paths to the node of a Tweet and to the nodes it points at, by edge kind
+NODE_PATHS = {
+    'users': (('user', 'id_str'), {
+        'reply': ('in_reply_to_user_id_str',),
+        'retweet': ('retweeted_status', 'user', 'id_str'),
+        'quote': ('quoted_status', 'user', 'id_str'),
+    }),
+    'tweets': (('id_str',), {
+        'reply': ('in_reply_to_status_id_str',),
+        'retweet': ('retweeted_status', 'id_str'),
+        'quote': ('quoted_status', 'id_str'),
+    }),
+}
+
+
+def _extract_edges(jsono, nodes):
+    """Returns the id of a Tweet, its node and the ``(kind, node)`` pairs
+    it points at, as plain strings so that lazy documents can be
+    released."""
+    source_path, target_paths = NODE_PATHS[nodes]
+    tweet_id = get_path(jsono, ('id_str',))
+    source = get_path(jsono, source_path)
+    targets = [(kind, get_path(jsono, path))
+               for kind, path in target_paths.items()]
+    return (None if tweet_id is None else str(tweet_id),
+            None if source is None else str(source),
+            [(kind, str(target)) for kind, target in targets
+             if target is not None])
+
+
+class TweetNetwork():
+    """Directed reply, retweet and quote network of a Tweet corpus, as
+    integer-indexed sparse (CSR) adjacency matrices, one per edge kind.
+
+    Nodes are users (or Tweets), and edges point from the replying,
+    retweeting or quoting node to the node replied to, retweeted or
+    quoted, weighted by the number of such interactions.
+    """
+
+    def __init__(self, node_ids, sources, targets, kinds):
+        self.node_ids = np.asarray(node_ids, dtype=np.str_)
+        self._index = None
+
+        n = len(self.node_ids)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        kinds = np.asarray(kinds, dtype=np.int8)
+
+        # Repeated (source, target) entries are summed into edge weights
+        self._adjacency = {}
+        for i, kind in enumerate(EDGE_KINDS):
+            mask = kinds == i
+            self._adjacency[kind] = scipy.sparse.csr_matrix(
+                (np.ones(mask.sum(), dtype=np.float64),
+                 (sources[mask], targets[mask])), shape=(n, n))
+
+    @classmethod
+    def from_reader(cls, reader, fileids=None, categories=None,
+                    nodes='users'):
+        """Build the network of the Tweets of a ``TweepyRawCorpusReader``
+        in a single streaming pass, with the reader's JSON backend. Tweets
+        duplicated across category files are counted once.
+
+        ``nodes`` is ``'users'`` for a network of user accounts or
+        ``'tweets'`` for a network of Tweets.
+        """
+        if nodes not in NODE_PATHS:
+            raise ValueError(f"nodes must be 'users' or 'tweets', "
+                             f"got {nodes!r}")
+
+        backend = get_backend(reader.json_backend)
+        index = {}  # node id -> node number
+        seen = set()
+        sources, targets, kinds = array('q'), array('q'), array('b')
+
+        for path, start, end, _ in reader.spans(fileids, categories):
+            for line in iter_span_lines(path, start, end):
+                tweet_id, source, edges = _extract_edges(
+                    backend.loads(line), nodes)
+                if source is None or tweet_id in seen:
+                    continue
+                if tweet_id is not None:
+                    seen.add(tweet_id)
+
+                source = index.setdefault(source, len(index))
+                for kind, target in edges:
+                    sources.append(source)
+                    targets.append(index.setdefault(target, len(index)))
+                    kinds.append(EDGE_KINDS.index(kind))
+
+        return cls(list(index), np.frombuffer(sources, dtype=np.int64),
+                   np.frombuffer(targets, dtype=np.int64),
+                   np.frombuffer(kinds, dtype=np.int8))
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def index(self, node_id):
+        """Returns the node number of a user (or Tweet) id"""
+        if self._index is None:
+            self._index = {node_id: i
+                           for i, node_id in enumerate(self.node_ids)}
+        return self._index[str(node_id)]
+
+    def adjacency(self, kinds=None):
+        """Returns the weighted adjacency matrix of the given edge kind(s),
+        all of them by default, in CSR format."""
+        if isinstance(kinds, str):
+            return self._adjacency[kinds]
+        kinds = kinds or EDGE_KINDS
+        return sum(self._adjacency[kind] for kind in kinds).tocsr()
+
+    def n_edges(self, kinds=None):
+        """Returns the number of distinct (source, target) node pairs"""
+        return self.adjacency(kinds).nnz
+
+    def in_degree(self, kinds=None, weighted=True):
+        """Returns the number of interactions (or of distinct nodes, if
+        not ``weighted``) every node received."""
+        adjacency = self.adjacency(kinds)
+        if not weighted:
+            return adjacency.getnnz(axis=0)
+        return np.asarray(adjacency.sum(axis=0)).ravel()
+
+    def out_degree(self, kinds=None, weighted=True):
+        """Returns the number of interactions (or of distinct nodes, if
+        not ``weighted``) every node made."""
+        adjacency = self.adjacency(kinds)
+        if not weighted:
+            return adjacency.getnnz(axis=1)
+        return np.asarray(adjacency.sum(axis=1)).ravel()
+
+    def pagerank(self, kinds=None, alpha=0.85, tol=1e-10, max_iter=100):
+        """Returns the PageRank of every node by power iteration over the
+        weighted adjacency matrix, in which nodes without outgoing edges
+        link to all nodes. Scores sum to 1."""
+        adjacency = self.adjacency(kinds)
+        n = adjacency.shape[0]
+        if n == 0:
+            return np.zeros(0)
+
+        out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+        dangling = out_weight == 0
+        inv_out_weight = np.divide(1.0, out_weight, where=~dangling,
+                                   out=np.zeros(n))
+        transposed = adjacency.T.tocsr()
+
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            teleport = (alpha * rank[dangling].sum() + 1.0 - alpha) / n
+            new_rank = alpha * transposed.dot(rank * inv_out_weight)
+            new_rank += teleport
+            converged = np.abs(new_rank - rank).sum() < n * tol
+            rank = new_rank
+            if converged:
+                break
+
+        return rank / rank.sum()
+
+    def reply_retweet_ratio(self):
+        """Returns the ratio of replies to retweets every node received,
+        NaN for nodes that were never retweeted. A high ratio flags
+        contested users (or Tweets), a low one amplified ones."""
+        replies = self.in_degree('reply')
+        retweets = self.in_degree('retweet')
+        return np.divide(replies, retweets, where=retweets > 0,
+                         out=np.full(len(self), np.nan))
@@ -0,0 +1,100 @@
+import json
+import os
+
+import numpy as np
+
+from corpus_readers import extract_attrib
+
+TWEETS_FILENAME = 'tweets.jsonl'
+TARGETS_FILENAME = 'targets.npz'
+
+
+class DedupTweetStore():
+    """Deduplicated storage of a categorized Tweet corpus.
+
+    The raw corpus holds a copy of every Tweet in every category file,
+    with only the ``target`` attribute value as different. The store
+    keeps a single canonical record per ``id_str`` and the targets as a
+    bit-packed (n_categories, n_tweets) matrix, so Tweets are parsed once
+    and per-category targets become array lookups.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+        with np.load(os.path.join(store_dir, TARGETS_FILENAME)) as data:
+            self._packed = data['packed']
+            self.ids = data['ids'].tolist()
+            self._categories = data['categories'].tolist()
+
+        self._index = {category: i
+                       for i, category in enumerate(self._categories)}
+
+    @classmethod
+    def build(cls, reader, store_dir):
+        """Build the store from a ``TweepyRawCorpusReader`` in a single
+        pass over all its categories and return it.
+        """
+        os.makedirs(store_dir, exist_ok=True)
+
+        categories = reader.categories()
+        rows = {}  # id_str -> row number in the store
+        targets = [bytearray() for _ in categories]
+
+        tweets_path = os.path.join(store_dir, TWEETS_FILENAME)
+        with open(tweets_path, 'w', encoding='utf8') as fp:
+            for i, category in enumerate(categories):
+                for jsono in reader.docs(reader.fileids(category)):
+                    id_str = jsono['id_str']
+                    if id_str not in rows:
+                        rows[id_str] = len(rows)
+                        for target in targets:
+                            target.append(0)
+
+                        canonical = {key: value for key, value in jsono.items()
+                                     if key != 'target'}
+                        fp.write(json.dumps(canonical) + '\n')
+
+                    targets[i][rows[id_str]] = extract_attrib(jsono, 'target') or 0
+
+        targets = np.array([np.frombuffer(target, dtype=np.uint8)
+                            for target in targets]).reshape(len(categories), -1)
+        np.savez(os.path.join(store_dir, TARGETS_FILENAME),
+                 packed=np.packbits(targets.astype(bool), axis=1),
+                 ids=np.array(list(rows), dtype=np.str_),
+                 categories=np.array(categories, dtype=np.str_))
+
+        return cls(store_dir)
+
+    def categories(self):
+        return list(self._categories)
+
+    def docs(self):
+        """Stream the canonical Tweet objects in store order"""
+        with open(os.path.join(self.store_dir, TWEETS_FILENAME),
+                  encoding='utf8') as fp:
+            for line in fp:
+                yield json.loads(line)
+
+    def records(self, attribs):
+        for jsono in self.docs():
+            yield tuple(extract_attrib(jsono, attrib) for attrib in attribs)
+
+    def strings(self):
+        return [text for text, in self.records(['full_text'])]
+
+    def labels(self):
+        return [labels for labels, in self.records(['labels'])]
+
+    def target(self, categories=None):
+        """Return the binary targets of every Tweet, aligned with ``ids``.
+        A single category gives a 1-D array, a list of categories (all of
+        them by default) gives an (n_tweets, n_categories) array.
+        """
+        if isinstance(categories, str):
+            row = self._packed[self._index[categories]]
+            return np.unpackbits(row, count=len(self.ids)).astype(np.int8)
+
+        categories = categories or self._categories
+        rows = self._packed[[self._index[c] for c in categories]]
+        return np.unpackbits(rows, axis=1, count=len(self.ids)).T.astype(np.int8)